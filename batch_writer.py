@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import logging
+import sqlite3
+import db
+import time
+
+DEFAULT_MAX_PENDING_WRITES = 200
+DEFAULT_MAX_PENDING_SECONDS = 5.0
+
+class BatchWriter:
+    """
+    Buffers writes to one SQLite DB and applies them in a single transaction per batch.
+
+    Writes are queued with `add(sql, params)` and flushed once `max_pending` are queued or the
+    oldest has waited `max_pending_seconds`, and always when the writer is closed (use it as a
+    context manager). Runs of the same statement go through one `executemany`, and writes are
+    applied in the order they were added.
+    """
+    def __init__(self, db_name=db.DB_NAME, max_pending=DEFAULT_MAX_PENDING_WRITES, max_pending_seconds=DEFAULT_MAX_PENDING_SECONDS):
+        self.db_name = db_name
+        self.max_pending = max_pending
+        self.max_pending_seconds = max_pending_seconds
+        self._pending = []
+        self._oldest_pending_at = None
+
+    def add(self, sql, params):
+        if not self._pending:
+            self._oldest_pending_at = time.monotonic()
+        self._pending.append((sql, params))
+        if len(self._pending) >= self.max_pending or time.monotonic() - self._oldest_pending_at >= self.max_pending_seconds:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, []
+        conn = db.connection(self.db_name)
+        try:
+            with conn:
+                run_start = 0
+                for i in range(1, len(pending) + 1):
+                    if i == len(pending) or pending[i][0] != pending[run_start][0]:
+                        conn.executemany(pending[run_start][0], [params for _, params in pending[run_start:i]])
+                        run_start = i
+        except sqlite3.Error as e:
+            logging.error(f"Failed to write {len(pending)} rows to {self.db_name}: {e}")
+            raise e
+        logging.debug(f"Wrote {len(pending)} rows to {self.db_name} in one transaction.")
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Flush even when unwinding from an error, so work done before it isn't lost.
+        self.close()
+        return False
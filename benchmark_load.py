@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Benchmark loading the whole DB into memory, the way every entry point starts.
+
+Builds a synthetic books.db (100k books in ~20k series, plus ratings) in a scratch directory
+and times Book.load_books_from_db / BookRating.load_ratings_from_db in a fresh process,
+reporting the wall time and how much the peak RSS grew while loading.
+
+  python3 benchmark_load.py                     # 100k books, 3 runs
+  python3 benchmark_load.py --books 20000 --runs 5
+  python3 benchmark_load.py --dir /tmp/bench    # reuse (or keep) the synthetic DB
+
+Run it on two revisions to compare them.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SEED = 1234
+
+
+def _max_rss_mb():
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere.
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+def build_db(directory, num_books):
+    os.chdir(directory)
+    import db
+    from book import INSERT_OR_REPLACE_BOOK_SQL
+    from book_rating import INSERT_RATING_IF_MISSING_SQL
+
+    rng = random.Random(SEED)
+    conn = db.connection()
+    books = []
+    for book_id in range(1, num_books + 1):
+        series = f"Series {rng.randrange(num_books // 5)}" if rng.random() < 0.8 else None
+        books.append((
+            book_id,
+            f"Synthetic Book {book_id}: The {rng.choice(['Lost', 'Iron', 'Last', 'Hidden'])} {rng.choice(['Crown', 'Dungeon', 'System', 'Path'])}",
+            series,
+            str(rng.randint(1, 12)) if series else None,
+            f"{rng.choice(['Ann', 'Bo', 'Cy', 'Di'])} {rng.choice(['Lee', 'Ray', 'Moss', 'Park'])}{rng.randrange(5000)}",
+            rng.choice([None, rng.randint(50, 1500)]),
+            f"https://www.goodreads.com/book/show/{book_id}",
+            round(rng.uniform(2.5, 4.9), 2),
+            rng.choice([0, rng.randint(1, 100000)]),
+        ))
+    conn.executemany(INSERT_OR_REPLACE_BOOK_SQL, books)
+    ratings = []
+    for book in rng.sample(books, num_books // 20):
+        tier = rng.choice(['S', 'A', 'B', 'F', None])
+        ratings.append((book[0], book[1], book[2], tier, None if tier else rng.choice([0, 1])))
+    conn.executemany(INSERT_RATING_IF_MISSING_SQL, ratings)
+    conn.commit()
+
+
+def measure(directory):
+    """Runs in the child process: load everything once, print timings and RSS growth as JSON."""
+    os.chdir(directory)
+    from book import Book
+    from book_rating import BookRating
+    import db
+    db.connection()  # open + migrate outside the measurement
+
+    rss_before = _max_rss_mb()
+    started = time.perf_counter()
+    books = Book.load_books_from_db()
+    books_loaded = time.perf_counter()
+    ratings = BookRating.load_ratings_from_db()
+    ratings_loaded = time.perf_counter()
+    print(json.dumps({
+        "books": len(books),
+        "ratings": len(ratings.rating_by_title),
+        "books_seconds": books_loaded - started,
+        "ratings_seconds": ratings_loaded - books_loaded,
+        "rss_growth_mb": _max_rss_mb() - rss_before,
+    }))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Benchmark loading a synthetic books DB.")
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--dir", help="directory for the synthetic DB (default: a temporary one)")
+    parser.add_argument("--build", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    directory = os.path.abspath(args.dir or tempfile.mkdtemp(prefix="books-bench-"))
+    if args.build:
+        build_db(directory, args.books)
+        return
+    if args.measure:
+        measure(directory)
+        return
+
+    if not os.path.exists(os.path.join(directory, "books.db")):
+        os.makedirs(directory, exist_ok=True)
+        logging.info(f"Building a synthetic DB with {args.books} books in {directory}..")
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--dir", directory, "--books", str(args.books), "--build"], check=True)
+
+    results = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--dir", directory, "--measure"],
+                             check=True, capture_output=True, text=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    best = min(results, key=lambda r: r["books_seconds"] + r["ratings_seconds"])
+    logging.info(
+        f"{best['books']} books: {best['books_seconds']:.3f}s, {best['ratings']} ratings: {best['ratings_seconds']:.3f}s, "
+        f"peak RSS +{best['rss_growth_mb']:.1f}MB (best of {args.runs})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,42 @@
 #!/usr/bin/env python3
 import goodreads
+import json
 import pprint as pp
 import logging
 import re
-import sqlite3
+import db
 from collections import defaultdict
-from utils import stripped, stripped_title
+from utils import stripped, stripped_title, trigrams
 from fuzzywuzzy import fuzz
 
-DB_NAME = "books.db"
-
-class BooksBySeries:
-    def __init__(self, books_by_series):
-        self.books_by_series = books_by_series
+DB_NAME = db.DB_NAME
+
+class SeriesStats:
+    """ A row of the series_stats table, kept up to date by the DB whenever a book is written. """
+    def __init__(self, series, book_count, total_pages, total_ratings, start_rating, min_rating, member_ids):
+        self.series = series
+        self.book_count = book_count
+        self.total_pages = total_pages
+        self.total_ratings = total_ratings
+        # Average rating of the first volume (by series number), 0 if unrated.
+        self.start_rating = start_rating
+        # Lowest average rating among books with more than 10 ratings, None if there are none.
+        self.min_rating = min_rating
+        # Book ids ordered by series number.
+        self.member_ids = member_ids
 
     @classmethod
-    def from_books(cls, books):
-        books_by_series = defaultdict(list)
-        for book in books:
-            if not book.series:
-                continue
-
-            books_by_series[book.series].append(book)
-        for series, books in books_by_series.items():
-            books_by_series[series] = sorted(books, key=lambda book: book.series_number)
-        return BooksBySeries(books_by_series)
-
-    def items(self):
-        return self.books_by_series.items()
-
-    def _accumulate_series_attribute(self, series, attr_lambda):
-        if series not in self.books_by_series:
-            raise ValueError(f"Failed to find series ({series}) in BooksBySeries, programmer error!")
-
-        return sum(attr_lambda(book) for book in self.books_by_series[series] if book)
-
-    def total_pages_reported_by_kindle_for_series(self, series):
-        return self._accumulate_series_attribute(series, lambda book: book.pages_reported_by_kindle or 0)
-
-    def total_number_of_ratings_for_series(self, series):
-        return self._accumulate_series_attribute(series, lambda book: book.number_of_ratings)
+    def load_for_series(cls, series_names):
+        """ SeriesStats by series name, for just the given series. """
+        conn = db.connection(DB_NAME)
+        cur = conn.execute("SELECT series, book_count, total_pages, total_ratings, start_rating, min_rating, member_ids FROM series_stats "
+                           "WHERE series IN (SELECT value FROM json_each(?))", (json.dumps(list(series_names)),))
+        return {row[0]: SeriesStats(*row[:6], member_ids=json.loads(row[6])) for row in cur.fetchall()}
 
-    def any_books_with_less_than_rating_in_series(self, book, rating):
-        if book.has_rating_less_than(rating):
-            return True
-
-        if book.series:
-            if book.series not in self.books_by_series:
-                raise ValueError(f"Failed to find series ({book.series}) in BooksBySeries, programmer error!")
-
-            for book in self.books_by_series[book.series]:
-                if book.has_rating_less_than(rating):
-                    return True
-
-        return False
-    
 def stripped_authors(authors):
     return [stripped(a) for a in re.split(r'[&\s,]', authors)]
 
-def authors_match(stripped_authors_a, authors_b):
-    stripped_authors_b = stripped_authors(authors_b)
+def authors_match(stripped_authors_a, stripped_authors_b):
     for author_a in stripped_authors_a:
         author_in_book = False
         for author_b in stripped_authors_b:
@@ -92,37 +69,126 @@ def find_book(books_by_id, books_by_title, book):
         return books_by_title.get_book_matching(book)
 
 class BooksByTitle:
+    """
+    Books keyed by exact title, backed by an inverted index so fuzzy matching only
+    scores a small candidate set instead of every book in the DB.
+
+    The index maps normalized author tokens to books and stripped-title trigrams to
+    books. Both are conservative: any book that could pass `authors_match` and the
+    title checks in `get_book_matching` is always a candidate, so results are the same
+    as a full scan. (A partial_ratio >= 90 between strings of 3+ characters always
+    leaves a common run of at least 3 characters, so a shared trigram is required.)
+    """
     def __init__(self, books):
         self.books_by_title = defaultdict(list)
+        # Iteration position of each title / book, so candidates can be checked in the
+        # same order as a scan over books_by_title.
+        self._title_order = {}
+        self._book_order = {}
+        self._books_by_author_token = defaultdict(set)
+        self._author_tokens_by_trigram = defaultdict(set)
+        self._short_author_tokens = set()
+        self._titles_by_trigram = defaultdict(set)
+        self._short_titles = set()
         for book in books:
-            self.books_by_title[book.title].append(book)
+            self.add(book)
+
+    def _candidates_for_author_token(self, author_token):
+        """ Ids of books with an author token equal to or fuzzy matching `author_token`. """
+        book_ids = set()
+        if len(author_token) < 3:
+            # partial_ratio only reaches 90 for strings this short on an exact substring
+            # (and never for an empty string unless both are empty).
+            for token, token_book_ids in self._books_by_author_token.items():
+                if token == author_token or (token and author_token and (author_token in token or token in author_token)):
+                    book_ids |= token_book_ids
+            return book_ids
+
+        tokens = set(self._short_author_tokens)
+        for trigram in trigrams(author_token):
+            tokens |= self._author_tokens_by_trigram.get(trigram, set())
+        for token in tokens:
+            if token == author_token or fuzz.partial_ratio(author_token, token) >= 90:
+                book_ids |= self._books_by_author_token[token]
+        return book_ids
+
+    def _candidates_for_authors(self, stripped_query_authors):
+        candidates = None
+        for author_token in set(stripped_query_authors):
+            book_ids = self._candidates_for_author_token(author_token)
+            candidates = book_ids if candidates is None else candidates & book_ids
+            if not candidates:
+                break
+        return candidates or set()
+
+    def _candidate_titles(self, query_stripped_title):
+        if len(query_stripped_title) < 3:
+            return None
+
+        titles = set(self._short_titles)
+        for trigram in trigrams(query_stripped_title):
+            titles |= self._titles_by_trigram.get(trigram, set())
+        return titles
 
     def get_book_matching(self, query_book):
-        stripped_query_authors = stripped_authors(query_book.author)
+        stripped_query_authors = query_book.normalized_author_tokens
         if query_book.title in self.books_by_title:
             for book in self.books_by_title[query_book.title]:
-                if authors_match(stripped_query_authors, book.author):
+                if authors_match(stripped_query_authors, book.normalized_author_tokens):
                     return book
 
-        for title, books in self.books_by_title.items():
-            for book in books:
-                if authors_match(stripped_query_authors, book.author):
-                    query_book_stripped_title = stripped_title(query_book.title)
-                    exact_title_in = query_book_stripped_title in stripped_title(title)
-                    title_close_enough = fuzz.partial_ratio(query_book_stripped_title, stripped_title(book.title)) >= 90
-                    if exact_title_in or title_close_enough:
-                        return book
+        query_book_stripped_title = query_book.normalized_title
+        candidate_titles = self._candidate_titles(query_book_stripped_title)
+        candidates = []
+        for book_id in self._candidates_for_authors(stripped_query_authors):
+            title, _ = self._book_order[book_id]
+            if candidate_titles is None or title in candidate_titles:
+                candidates.append(book_id)
+        candidates.sort(key=lambda book_id: (self._title_order[self._book_order[book_id][0]], self._book_order[book_id][1]))
+
+        for book_id in candidates:
+            title, index = self._book_order[book_id]
+            book = self.books_by_title[title][index]
+            if authors_match(stripped_query_authors, book.normalized_author_tokens):
+                exact_title_in = query_book_stripped_title in book.normalized_title
+                title_close_enough = fuzz.partial_ratio(query_book_stripped_title, book.normalized_title) >= 90
+                if exact_title_in or title_close_enough:
+                    return book
         return None
     
     def has_book(self, query_book):
-        self.get_book_matching(query_book) is not None
+        return self.get_book_matching(query_book) is not None
     
     def add(self, book):
-        self.books_by_title[book.title].append(book)
+        title = book.title
+        books = self.books_by_title[title]
+        book_id = id(book)
+        self._book_order[book_id] = (title, len(books))
+        books.append(book)
+
+        if title not in self._title_order:
+            self._title_order[title] = len(self._title_order)
+            if len(book.normalized_title) < 3:
+                self._short_titles.add(title)
+            for trigram in trigrams(book.normalized_title):
+                self._titles_by_trigram[trigram].add(title)
+
+        for token in book.normalized_author_tokens:
+            if token not in self._books_by_author_token:
+                if len(token) < 3:
+                    self._short_author_tokens.add(token)
+                for trigram in trigrams(token):
+                    self._author_tokens_by_trigram[trigram].add(token)
+            self._books_by_author_token[token].add(book_id)
 
         
 
 class Book:
+    # Slotted: entry points load every book in the DB, so keep them small.
+    __slots__ = ('id', 'title', 'author', 'series', 'series_number', 'pages_reported_by_kindle', 'goodreads_link',
+                 'average_rating', 'number_of_ratings', 'series_link',
+                 '_normalized_title', '_normalized_author_tokens', '_normalized_author_names')
+
     def __init__(self, title, author):
         self.id = None
         self.title = title
@@ -133,19 +199,60 @@ class Book:
         self.goodreads_link = None
         self.average_rating = None
         self.number_of_ratings = None
+        # Not stored in the DB, only known when populated from a Goodreads book page.
+        self.series_link = None
+        self.refresh_normalized_fields()
+
+    @classmethod
+    def from_row(cls, row):
+        """ Build a Book straight from a row selected with BOOK_COLUMNS (extra trailing columns are ignored). """
+        book = cls.__new__(cls)
+        (book.id, book.title, book.series, book.series_number, book.author, book.pages_reported_by_kindle,
+         book.goodreads_link, book.average_rating, book.number_of_ratings) = row[:9]
+        book.series_link = None
+        book._normalized_title = book._normalized_author_tokens = book._normalized_author_names = None
+        return book
+
+    def refresh_normalized_fields(self):
+        """ Drop the cached normalized title / author forms used by fuzzy matching, call whenever title or author change. """
+        self._normalized_title = None
+        self._normalized_author_tokens = None
+        self._normalized_author_names = None
+
+    # The normalized forms are computed on first use, most loaded books are never matched.
+    @property
+    def normalized_title(self):
+        if self._normalized_title is None:
+            self._normalized_title = stripped_title(self.title)
+        return self._normalized_title
+
+    @property
+    def normalized_author_tokens(self):
+        """ Tokens compared one by one in `authors_match`. """
+        if self._normalized_author_tokens is None:
+            self._normalized_author_tokens = stripped_authors(self.author)
+        return self._normalized_author_tokens
+
+    @property
+    def normalized_author_names(self):
+        """ Full author names (split on '&') compared against Goodreads search results. """
+        if self._normalized_author_names is None:
+            self._normalized_author_names = [stripped(a) for a in self.author.split('&')]
+        return self._normalized_author_names
 
     @classmethod
     def load_books_from_db(cls):
-        conn = sqlite3.connect(DB_NAME)
-        create_table_if_not_exists(conn)
+        conn = db.connection(DB_NAME)
         books = select_all_books(conn)
-        conn.close()
         return books
 
-    def sync_with_db(self):
-        conn = sqlite3.connect(DB_NAME)
+    def sync_with_db(self, writer=None):
+        """ Write the book to the DB, queued on `writer` (a BatchWriter) if given. """
+        if writer is not None:
+            writer.add(INSERT_OR_REPLACE_BOOK_SQL, _book_row(self))
+            return
+        conn = db.connection(DB_NAME)
         insert_or_replace_book(conn, self)
-        conn.close()
 
     def populate_from_goodreads(self):
         if self.goodreads_link is not None:
@@ -176,6 +283,8 @@ class Book:
         self.number_of_ratings = goodreads_book.number_of_ratings
         self.series = goodreads_book.series
         self.series_number = goodreads_book.series_number
+        self.series_link = getattr(goodreads_book, 'series_link', None)
+        self.refresh_normalized_fields()
         logging.debug(f"Populated book from goodreads: {self.title} ({self.author}).")
 
     def refresh_if_part_of_series_now_on_goodreads(self):
@@ -190,17 +299,37 @@ class Book:
         else:
             return False
     
-    def find_books_from_series(self):
-        series_link = goodreads.series_link_from_book(self)
+    def find_books_from_series(self, known_ids=None):
+        """
+        Books in this book's series, with member pages loaded concurrently over the shared
+        fetcher. `known_ids(ids)`, if given, picks the member ids the caller would discard
+        anyway (e.g. already in the DB), whose pages aren't loaded and which are left out.
+        """
+        series_link = self.series_link or goodreads.series_link_from_book(self)
         if not series_link:
             raise ValueError(f"Failed to find series link for book ({self.title}).")
 
+        book_urls = goodreads.book_urls_from_series_url(series_link)
+        if known_ids is not None:
+            ids_by_url = {}
+            for book_url in book_urls:
+                match = re.search(r'/book/show/(\d+)', book_url)
+                if match:
+                    ids_by_url[book_url] = int(match.group(1))
+            skipped_ids = known_ids(set(ids_by_url.values()))
+            book_urls = [book_url for book_url in book_urls if ids_by_url.get(book_url) not in skipped_ids]
+
+        goodreads_books = {}
+        for book_url, goodreads_book in goodreads.load_goodreads_book_pages(book_urls):
+            if isinstance(goodreads_book, Exception):
+                raise goodreads_book
+            goodreads_books[book_url] = goodreads_book
+
+        # In series order, whichever page arrived first.
         books = []
-        for book_url in goodreads.book_urls_from_series_url(series_link):
-            goodreads_book = goodreads.load_goodreads_book_from_url(book_url)
-
+        for book_url in book_urls:
             book = Book('', '')
-            book._populate_from_goodreads_book(goodreads_book)
+            book._populate_from_goodreads_book(goodreads_books[book_url])
             books.append(book)
 
         return books
@@ -216,47 +345,20 @@ class Book:
         return self.average_rating < rating
 
 
-def create_table_if_not_exists(conn):
-    """ create a table for storing book data """
-    try:
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS books
-                     (id INTEGER PRIMARY KEY,
-                      title TEXT,
-                      series TEXT,
-                      series_number TEXT,
-                      author TEXT,
-                      pages_reported_by_kindle INTEGER,
-                      goodreads_link TEXT,
-                      average_rating REAL,
-                      number_of_ratings INTEGER)''')
-        conn.commit()
-    except sqlite3.Error as e:
-        logging.error(e)
-        raise e
+INSERT_OR_REPLACE_BOOK_SQL = ''' INSERT OR REPLACE INTO books(id,title,series,series_number,author,pages_reported_by_kindle,goodreads_link,average_rating,number_of_ratings)
+              VALUES(?,?,?,?,?,?,?,?,?) '''
+
+def _book_row(book):
+    return (book.id, book.title, book.series, book.series_number, book.author, book.pages_reported_by_kindle, book.goodreads_link, book.average_rating, book.number_of_ratings)
 
 def insert_or_replace_book(conn, book):
-    sql = ''' INSERT OR REPLACE INTO books(id,title,series,series_number,author,pages_reported_by_kindle,goodreads_link,average_rating,number_of_ratings)
-              VALUES(?,?,?,?,?,?,?,?,?) '''
     cur = conn.cursor()
-    cur.execute(sql, (book.id, book.title, book.series, book.series_number, book.author, book.pages_reported_by_kindle, book.goodreads_link, book.average_rating, book.number_of_ratings))
+    cur.execute(INSERT_OR_REPLACE_BOOK_SQL, _book_row(book))
     conn.commit()
     return cur.lastrowid
 
+BOOK_COLUMNS = "id,title,series,series_number,author,pages_reported_by_kindle,goodreads_link,average_rating,number_of_ratings"
+
 def select_all_books(conn):
     """ Query all books in the database """
-    cur = conn.cursor()
-    cur.execute("SELECT id,title,series,series_number,author,pages_reported_by_kindle,goodreads_link,average_rating,number_of_ratings FROM books")
-
-    books = []
-    for row in cur.fetchall():
-        book = Book(title=row[1], author=row[4])
-        book.id = row[0]
-        book.series = row[2]
-        book.series_number = row[3]
-        book.pages_reported_by_kindle = row[5]
-        book.goodreads_link = row[6]
-        book.average_rating = row[7]
-        book.number_of_ratings = row[8]
-        books.append(book)
-    return books
+    return list(map(Book.from_row, conn.execute(f"SELECT {BOOK_COLUMNS} FROM books")))
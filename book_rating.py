@@ -1,12 +1,11 @@
 #!/usr/bin/env python3
 from collections import defaultdict
-import logging
 import goodreads
 import pprint as pp
-import sqlite3
+import db
 from enum import Enum
 
-DB_NAME = "book_ratings.db"
+DB_NAME = db.DB_NAME
 
 class Tier(Enum):
     F = 'F'
@@ -14,6 +13,8 @@ class Tier(Enum):
     A = 'A'
     S = 'S'
 
+_TIERS_BY_VALUE = {tier.value: tier for tier in Tier}
+
 class BookRatings:
     def __init__(self, rating_by_title, ratings_by_series):
         self.rating_by_title = rating_by_title
@@ -39,13 +40,13 @@ class BookRatings:
     def has_rated_series(self, series):
         return series in self.ratings_by_series
 
-    def _mark_book_helper(self, book, rating_fn):
+    def _mark_book_helper(self, book, rating_fn, writer=None):
         if book.title in self.rating_by_title:
             raise ValueError("Should not rate book with existing rating, programmer error!")
 
         rating = BookRating.from_book(book)
         rating_fn(rating)
-        rating.sync_with_db()
+        rating.sync_with_db(writer)
         self.rating_by_title[book.title] = rating
         if rating.series:
             self.ratings_by_series[rating.series].append(rating)
@@ -53,8 +54,8 @@ class BookRatings:
     def mark_book_with_tier(self, book, tier):
         self._mark_book_helper(book, lambda rating: setattr(rating, 'tier', tier))
 
-    def mark_book_as_uninterested(self, book):
-        self._mark_book_helper(book, lambda rating: setattr(rating, 'interested', False))
+    def mark_book_as_uninterested(self, book, writer=None):
+        self._mark_book_helper(book, lambda rating: setattr(rating, 'interested', False), writer)
 
     def mark_book_as_interested(self, book):
         self._mark_book_helper(book, lambda rating: setattr(rating, 'interested', True))
@@ -70,22 +71,31 @@ class BookRatings:
         return False
 
 class BookRating:
-    def __init__(self, title, series, tier, interested):
+    __slots__ = ('book_id', 'title', 'series', 'tier', 'interested')
+
+    def __init__(self, title, series, tier, interested, book_id=None):
+        self.book_id = book_id
         self.title = title
         self.series = series
         self.tier = tier
         self.interested = interested
 
+    @classmethod
+    def from_row(cls, row):
+        """ Build a BookRating straight from a (title, series, tier, interested, book_id) row. """
+        rating = cls.__new__(cls)
+        rating.title, rating.series, tier, rating.interested, rating.book_id = row
+        rating.tier = _TIERS_BY_VALUE[tier] if tier else None
+        return rating
+
     @classmethod
     def from_book(cls, book):
-        return BookRating(title=book.title, series=book.series, tier=None, interested=None)
+        return BookRating(title=book.title, series=book.series, tier=None, interested=None, book_id=book.id)
 
     @classmethod
     def load_ratings_from_db(cls):
-        conn = sqlite3.connect(DB_NAME)
-        create_table_if_not_exists(conn)
+        conn = db.connection(DB_NAME)
         ratings = select_all_ratings(conn)
-        conn.close()
         for rating in ratings:
             if rating.interested is None and rating.tier is None:
                 raise ValueError(f"Found invalid rating in DB with title ({rating.title}), please removing!")
@@ -99,35 +109,30 @@ class BookRating:
 
         return BookRatings(rating_by_title=rating_by_title, ratings_by_series=ratings_by_series)
 
-    def sync_with_db(self):
-        conn = sqlite3.connect(DB_NAME)
+    def sync_with_db(self, writer=None):
+        if writer is not None:
+            # The title is unique, so an existing rating is left untouched like below.
+            writer.add(INSERT_RATING_IF_MISSING_SQL, _rating_row(self))
+            return
+        conn = db.connection(DB_NAME)
         if not rating_exists(conn, self.title):
             insert_rating(conn, self)
-        conn.close()
-
-def create_table_if_not_exists(conn):
-    try:
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS book_ratings 
-                    (title TEXT PRIMARY KEY,
-                    series TEXT,
-                    tier TEXT,
-                    interested BOOLEAN
-                    )''')
-        conn.commit()
-    except sqlite3.Error as e:
-        logging.error(e)
-        raise e
 
-def insert_rating(conn, rating):
-    """ Insert a new rating into the ratings table """
-    sql = ''' INSERT INTO book_ratings(title,series,tier,interested)
-              VALUES(?,?,?,?) '''
-    cur = conn.cursor()
+INSERT_RATING_IF_MISSING_SQL = ''' INSERT OR IGNORE INTO book_ratings(book_id,title,series,tier,interested)
+              VALUES(?,?,?,?,?) '''
+
+def _rating_row(rating):
     tier_value = None
     if rating.tier:
         tier_value = rating.tier.value
-    cur.execute(sql, (rating.title, rating.series, tier_value, rating.interested))
+    return (rating.book_id, rating.title, rating.series, tier_value, rating.interested)
+
+def insert_rating(conn, rating):
+    """ Insert a new rating into the ratings table """
+    sql = ''' INSERT INTO book_ratings(book_id,title,series,tier,interested)
+              VALUES(?,?,?,?,?) '''
+    cur = conn.cursor()
+    cur.execute(sql, _rating_row(rating))
     conn.commit()
     return cur.lastrowid
 
@@ -140,14 +145,4 @@ def rating_exists(conn, title):
 
 def select_all_ratings(conn):
     """ Query all ratings in the database """
-    cur = conn.cursor()
-    cur.execute("SELECT title,series,tier,interested FROM book_ratings")
-
-    ratings = []
-    for row in cur.fetchall():
-        tier = None
-        if row[2]:
-            tier = Tier(row[2])
-        rating = BookRating(title=row[0], series=row[1], tier=tier, interested=row[3])
-        ratings.append(rating)
-    return ratings 
+    return list(map(BookRating.from_row, conn.execute("SELECT title,series,tier,interested,book_id FROM book_ratings")))
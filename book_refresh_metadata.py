@@ -1,50 +1,54 @@
 #!/usr/bin/env python3
 import goodreads
 import pprint as pp
-import logging
-import sqlite3
+import db
 from collections import defaultdict
-from datetime import date, timedelta 
+from datetime import date, timedelta
 
-DB_NAME = "book_refresh_metadata.db"
+DB_NAME = db.DB_NAME
 
 MIN_TIME_BEFORE_NEXT_REFRESH = timedelta(days=15)
 
+REPLACE_BOOK_REFRESH_SQL = "INSERT OR REPLACE INTO book_refreshes (book_id, last_refresh) VALUES (?, ?)"
+REPLACE_SERIES_REFRESH_SQL = "INSERT OR REPLACE INTO series_refreshes (series, last_refresh) VALUES (?, ?)"
+
 class BookRefreshMetadata:
-    def __init__(self, book_refreshes_by_title, book_refreshes_by_series):
-        self.book_refreshes_by_title = book_refreshes_by_title
+    def __init__(self, book_refreshes_by_id, book_refreshes_by_series):
+        self.book_refreshes_by_id = book_refreshes_by_id
         self.book_refreshes_by_series = book_refreshes_by_series
 
-    def should_refresh_title(self, title):
-        return self.should_refresh_from_last_refresh(self.book_refreshes_by_title.get(title))
+    def should_refresh_book(self, book):
+        return self.should_refresh_from_last_refresh(self.book_refreshes_by_id.get(book.id))
 
     def should_refresh_series(self, series):
         return self.should_refresh_from_last_refresh(self.book_refreshes_by_series.get(series))
 
-    def handle_book_newly_populated(self, book):
+    def handle_book_newly_populated(self, book, writer=None):
         if book.series:
-            self.handle_series_refreshed(book.series)
+            self.handle_series_refreshed(book.series, writer)
         else:
-            self.handle_title_refreshed(book.title)
-    
-    def handle_title_refreshed(self, title):
+            self.handle_book_refreshed(book, writer)
+
+    def handle_book_refreshed(self, book, writer=None):
         refresh_date = date.today()
-        self.book_refreshes_by_title[title] = refresh_date
-        conn = sqlite3.connect(DB_NAME)
-        cur = conn.cursor()
-        cur.execute("INSERT OR REPLACE INTO book_refresh_by_title (title, last_refresh) VALUES (?, ?)", (title, refresh_date.isoformat()))
-        conn.commit()
-        conn.close()
-    
-    def handle_series_refreshed(self, series):
+        self.book_refreshes_by_id[book.id] = refresh_date
+        self._write(REPLACE_BOOK_REFRESH_SQL, (book.id, refresh_date.isoformat()), writer)
+
+    def handle_series_refreshed(self, series, writer=None):
         refresh_date = date.today()
         self.book_refreshes_by_series[series] = refresh_date
-        conn = sqlite3.connect(DB_NAME)
+        self._write(REPLACE_SERIES_REFRESH_SQL, (series, refresh_date.isoformat()), writer)
+
+    def _write(self, sql, params, writer):
+        """ Queue the write on `writer` (a BatchWriter) if given, else commit it right away. """
+        if writer is not None:
+            writer.add(sql, params)
+            return
+        conn = db.connection(DB_NAME)
         cur = conn.cursor()
-        cur.execute("INSERT OR REPLACE INTO book_refresh_by_series (series, last_refresh) VALUES (?, ?)", (series, refresh_date.isoformat()))
+        cur.execute(sql, params)
         conn.commit()
-        conn.close()
-    
+
     def should_refresh_from_last_refresh(self, last_refresh):
         if last_refresh is None:
             return True
@@ -52,35 +56,18 @@ class BookRefreshMetadata:
 
     @classmethod
     def load_from_db(cls):
-        conn = sqlite3.connect(DB_NAME)
-
-        create_table_if_not_exists(conn)
+        conn = db.connection(DB_NAME)
 
         cur = conn.cursor()
-        cur.execute("SELECT title, last_refresh FROM book_refresh_by_title")
-        book_refreshes_by_title = {}
+        cur.execute("SELECT book_id, last_refresh FROM book_refreshes")
+        book_refreshes_by_id = {}
         for row in cur.fetchall():
-            book_refreshes_by_title[row[0]] = date(*map(int, row[1].split('-')))
+            book_refreshes_by_id[row[0]] = date(*map(int, row[1].split('-')))
 
         cur = conn.cursor()
-        cur.execute("SELECT series, last_refresh FROM book_refresh_by_series")
+        cur.execute("SELECT series, last_refresh FROM series_refreshes")
         book_refreshes_by_series = {}
         for row in cur.fetchall():
             book_refreshes_by_series[row[0]] = date(*map(int, row[1].split('-')))
 
-        conn.close()
-        return BookRefreshMetadata(book_refreshes_by_title, book_refreshes_by_series)
-
-def create_table_if_not_exists(conn):
-    try:
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS book_refresh_by_title
-                     (title TEXT PRIMARY KEY,
-                      last_refresh TEXT)''')
-        c.execute('''CREATE TABLE IF NOT EXISTS book_refresh_by_series
-                     (series TEXT PRIMARY KEY,
-                      last_refresh TEXT)''')
-        conn.commit()
-    except sqlite3.Error as e:
-        logging.error(e)
-        raise e
\ No newline at end of file
+        return BookRefreshMetadata(book_refreshes_by_id, book_refreshes_by_series)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import json
+import db
+from book import BOOK_COLUMNS, Book, BooksByTitle, find_book
+
+DB_NAME = db.DB_NAME
+
+class BookRepository:
+    """
+    Targeted queries over the books table, so commands only materialize the rows they use.
+
+    Every book handed out is kept in an identity map (one object per id), so later queries
+    return the same objects callers have already modified, and books added through `add`
+    are found by id even while their write is still queued on a BatchWriter. The fuzzy title
+    index needs every book and is only built the first time something matches by title.
+    """
+    def __init__(self, db_name=DB_NAME):
+        self.db_name = db_name
+        self._books_by_id = {}
+        self._books_by_title = None
+        self._all_loaded = False
+
+    def _query(self, where="1", params=(), order_by="id"):
+        cur = db.connection(self.db_name).execute(
+            f"SELECT {BOOK_COLUMNS} FROM books WHERE {where} ORDER BY {order_by}", params)
+        books = []
+        for row in cur:
+            book = self._books_by_id.get(row[0])
+            if book is None:
+                book = self._books_by_id[row[0]] = Book.from_row(row)
+            books.append(book)
+        return books
+
+    def by_id(self, book_id):
+        """ The book with `book_id`, or None. """
+        book = self._books_by_id.get(book_id)
+        if book is None and not self._all_loaded:
+            books = self._query("id = ?", (book_id,))
+            book = books[0] if books else None
+        return book
+
+    def by_ids(self, book_ids):
+        """ Books by id for the given ids (missing ids are left out), in one query. """
+        book_ids = set(book_ids)
+        missing = [book_id for book_id in book_ids if book_id not in self._books_by_id]
+        if missing and not self._all_loaded:
+            self._query("id IN (SELECT value FROM json_each(?))", (json.dumps(missing),))
+        return {book_id: self._books_by_id[book_id] for book_id in book_ids if book_id in self._books_by_id}
+
+    def by_titles(self, titles):
+        """ Books by exact title (the highest id wins if a title is shared). """
+        books = self._query("title IN (SELECT value FROM json_each(?))", (json.dumps(list(titles)),))
+        return {book.title: book for book in books}
+
+    def with_titles(self, titles):
+        """ Every book with one of `titles` (exact), by title, in id order. """
+        books_by_title = {}
+        for book in self._query("title IN (SELECT value FROM json_each(?))", (json.dumps(list(titles)),)):
+            books_by_title.setdefault(book.title, []).append(book)
+        return books_by_title
+
+    def by_series(self, series):
+        """ Books in `series`, ordered by series number. """
+        return self._query("series = ?", (series,), order_by="series_number, id")
+
+    def ids_with_series(self, book_ids):
+        """
+        The `book_ids` of books in the DB with a series, the ones `find` matches by id (a book
+        without a series is replaced). Only queries the DB, so it's safe from any thread.
+        """
+        cur = db.connection(self.db_name).execute(
+            '''SELECT id FROM books WHERE NULLIF(series, '') IS NOT NULL
+               AND id IN (SELECT value FROM json_each(?))''', (json.dumps(list(book_ids)),))
+        return {row[0] for row in cur}
+
+    def series_stale_since(self, cutoff):
+        """ Names of series that were never refreshed, or last refreshed on or before `cutoff` (a date). """
+        cur = db.connection(self.db_name).execute(
+            '''SELECT s.series FROM series_stats s
+               LEFT JOIN series_refreshes r ON r.series = s.series
+               WHERE r.last_refresh IS NULL OR r.last_refresh <= ?
+               ORDER BY s.series''', (cutoff.isoformat(),))
+        return [row[0] for row in cur]
+
+    def stale_since(self, cutoff, without_series=False):
+        """ Books never refreshed, or last refreshed on or before `cutoff` (a date). """
+        where = "id NOT IN (SELECT book_id FROM book_refreshes WHERE last_refresh > ?)"
+        if without_series:
+            where += " AND NULLIF(series, '') IS NULL"
+        return self._query(where, (cutoff.isoformat(),))
+
+    def unreleased(self):
+        """ Books with no ratings yet. """
+        return self._query("number_of_ratings = 0")
+
+    def all(self):
+        """ Every book in the DB. """
+        if not self._all_loaded:
+            self._query()
+            self._all_loaded = True
+        return list(self._books_by_id.values())
+
+    def count(self):
+        return db.connection(self.db_name).execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+    @property
+    def books_by_title(self):
+        """ BooksByTitle over every book, built on first use. """
+        if self._books_by_title is None:
+            self._books_by_title = BooksByTitle(self.all())
+        return self._books_by_title
+
+    def find(self, book):
+        """ `find_book` against the DB: by id when `book` has one, else by fuzzy title match. """
+        if book.id:
+            existing = self.by_id(book.id)
+            return find_book({book.id: existing} if existing else {}, None, book)
+        return find_book(None, self.books_by_title, book)
+
+    def add(self, book, writer=None):
+        """ Write a new book (queued on `writer` if given) and make it visible to later lookups. """
+        book.sync_with_db(writer)
+        self._books_by_id[book.id] = book
+        if self._books_by_title is not None:
+            self._books_by_title.add(book)
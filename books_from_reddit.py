@@ -1,20 +1,25 @@
 import requests
 import re
-from bs4 import BeautifulSoup
 import pprint as pp
 from book import Book
-from goodreads import requests_get_with_retry
+from goodreads import TargetedStrainer, parsed_html, requests_get_with_retry
 
 LOWERCASE_MONTHS = set([
     "january", "february", "march", "april", "may", "june",
     "july", "august", "september", "october", "november", "december"
 ])
 
+# Only build the parts of each Reddit page we actually read.
+_TABLE_STRAINER = TargetedStrainer(lambda name, attrs: name == 'table')
+_WIKI_CONTENT_STRAINER = TargetedStrainer(
+    lambda name, attrs: name == 'div' and 'wiki-page-content' in attrs.get('class', '').split())
+_LINK_STRAINER = TargetedStrainer(lambda name, attrs: name == 'a')
+
 def find_books_from_table_in_reddit_releases_post(url):
     # www.reddit.com now serves a JS shell with no table; old.reddit.com renders the real HTML.
     response = requests_get_with_retry(_old_reddit_url(url))
     response.raise_for_status()
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = parsed_html(response, parse_only=_TABLE_STRAINER)
     table = soup.find('table')
     if not table:
         return []
@@ -37,6 +42,11 @@ def _old_reddit_url(url):
     # The wiki only renders parseable HTML on old.reddit.com; www/new serve a JS shell.
     return re.sub(r'https?://(www|new)\.reddit\.com', 'https://old.reddit.com', url)
 
+def reddit_post_id(url):
+    """ A Reddit post url's id as a number (ids are base 36 and increase over time), or None. """
+    match = re.search(r'/comments/([0-9a-z]+)', url)
+    return int(match.group(1), 36) if match else None
+
 def _normalize_reddit_host(url):
     # Monthly post fetching (and its canonical-url redirect handling) expects www.reddit.com.
     return re.sub(r'https?://(old|new)\.reddit\.com', 'https://www.reddit.com', url)
@@ -45,7 +55,7 @@ def find_release_thread_urls_from_wiki(url):
     """Parse the new-releases wiki index page into an ordered list of monthly release thread URLs."""
     response = requests_get_with_retry(_old_reddit_url(url))
     response.raise_for_status()
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = parsed_html(response, parse_only=_WIKI_CONTENT_STRAINER)
     content = soup.find('div', class_='wiki-page-content')
     if not content:
         return []
@@ -69,7 +79,7 @@ def find_release_thread_urls_from_wiki(url):
 def follow_reddit_releases_link(url):
     response = requests_get_with_retry(_old_reddit_url(url))
     response.raise_for_status()
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = parsed_html(response, parse_only=_LINK_STRAINER)
     for a_element in soup.find_all('a'):
         text = a_element.text.strip().lower()
         if text not in LOWERCASE_MONTHS:
@@ -6,7 +6,7 @@ taxonomy with per-theme preference weights, and writes:
   - theme_profile.json  (machine-readable; consumed by classify_and_rank.py)
   - theme_profile.md    (human verification report -- read & edit weights before classifying)
 
-Run `python3 scan_descriptions.py --scope profile` first to populate the cache.
+Run `python3 scan_descriptions.py --scope profile` first to fetch the descriptions.
 """
 import argparse
 import json
@@ -14,7 +14,8 @@ import logging
 from datetime import datetime, timezone
 
 import theme_scan_lib as lib
-from book import Book
+from book_repository import BookRepository
+from description_store import DescriptionStore
 from book_rating import BookRating
 
 DESC_CHARS = 600  # per-book description budget in the prompt
@@ -60,18 +61,18 @@ Respond with ONLY valid JSON (no prose, no markdown fences) of the form:
 """
 
 
-def _fmt(book, cache, prefix):
-    desc = lib.get_description(cache, book.id) or "(no description cached)"
+def _fmt(book, descriptions, prefix):
+    desc = descriptions.description(book.id) or "(no description cached)"
     if len(desc) > DESC_CHARS:
         desc = desc[:DESC_CHARS].rsplit(" ", 1)[0] + "..."
     series = f" [series: {book.series}]" if book.series else ""
     return f"- {prefix} | {book.title}{series}\n  {desc}"
 
 
-def build_prompt(split, cache):
-    liked_lines = [_fmt(b, cache, f"tier {t.value}") for b, t in split["liked"]]
-    disliked_lines = [_fmt(b, cache, "F") for b in split["disliked_f"]]
-    disliked_lines += [_fmt(b, cache, "SKIP") for b in split["disliked_sample"]]
+def build_prompt(split, descriptions):
+    liked_lines = [_fmt(b, descriptions, f"tier {t.value}") for b, t in split["liked"]]
+    disliked_lines = [_fmt(b, descriptions, "F") for b in split["disliked_f"]]
+    disliked_lines += [_fmt(b, descriptions, "SKIP") for b in split["disliked_sample"]]
     return PROMPT_TEMPLATE.format(liked="\n".join(liked_lines), disliked="\n".join(disliked_lines))
 
 
@@ -117,13 +118,13 @@ def main():
     parser.add_argument("--model", default="sonnet", help="claude model (e.g. sonnet, opus)")
     args = parser.parse_args()
 
-    books = Book.load_books_from_db()
     ratings = BookRating.load_ratings_from_db()
-    split = lib.profile_split(books, ratings)
-    cache = lib.load_cache()
+    split = lib.profile_split(BookRepository(), ratings)
+    descriptions = DescriptionStore()
 
     wanted = lib.profile_book_ids(split)
-    missing = [bid for bid in wanted if not lib.get_description(cache, bid)]
+    described = descriptions.described_ids(wanted)
+    missing = [bid for bid in wanted if bid not in described]
     if missing:
         logging.warning(
             f"{len(missing)}/{len(wanted)} profile books have no cached description. "
@@ -134,7 +135,7 @@ def main():
         f"Building profile from {len(split['liked'])} liked, {len(split['disliked_f'])} F-tier, "
         f"{len(split['disliked_sample'])} sampled dislikes via claude ({args.model})..."
     )
-    prompt = build_prompt(split, cache)
+    prompt = build_prompt(split, descriptions)
     raw = lib.call_claude(prompt, model=args.model, timeout=600)
     parsed = lib.parse_json_response(raw)
 
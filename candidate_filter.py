@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+import db
+from book import BOOK_COLUMNS, Book
+
+# Books with this many ratings or fewer don't count towards the "any book under N stars" rule
+# (series_stats.min_rating uses the same cut-off).
+MIN_RATINGS_FOR_LOW_RATING = 10
+MIN_SERIES_AVERAGE_RATING = 4
+
+class CandidateRule:
+    """
+    One rate-continuous filter. `sql` is a condition that rejects a book when true, evaluated
+    against the book `b`, its series_stats row `s` and the ratings of its series `sr` (see
+    CandidateFilter.QUERY). `explain(evaluation)` says why in verbose output.
+    """
+    def __init__(self, name, sql, explain, marks_uninterested=False):
+        self.name = name
+        self.sql = sql
+        self.explain = explain
+        # rate-continuous records these books as uninterested, so they're never reconsidered.
+        self.marks_uninterested = marks_uninterested
+
+def _explain_pages(evaluation):
+    book = evaluation.book
+    book_pages = book.pages_reported_by_kindle or "unknown"
+    series_pages = evaluation.series_pages if book.series else "N/A"
+    return f"Not enough pages (book: {book_pages}, series: {series_pages}, min: {evaluation.min_pages})"
+
+def _explain_ratings(evaluation):
+    book = evaluation.book
+    book_ratings = book.number_of_ratings or 0
+    series_ratings = evaluation.series_ratings if book.series else 0
+    return f"Not enough ratings (book: {book_ratings}, series: {series_ratings}, min: {evaluation.min_ratings})"
+
+_BOOK_HAS_LOW_RATING_SQL = "(COALESCE(b.number_of_ratings, 0) > :min_ratings_for_low_rating AND COALESCE(b.average_rating, 0) != 0 AND b.average_rating < :min_series_average_rating)"
+
+# In order, a book is rejected by the first rule that matches.
+RULES = [
+    CandidateRule('already_rated',
+                  "b.title IN (SELECT title FROM book_ratings)",
+                  lambda e: "Book already directly rated"),
+    CandidateRule('f_tier_or_uninterested_series',
+                  "COALESCE(sr.f_tier_or_uninterested, 0)",
+                  lambda e: "Book or series rated as F tier or uninterested",
+                  marks_uninterested=True),
+    CandidateRule('low_rated_book_in_series',
+                  f"({_BOOK_HAS_LOW_RATING_SQL} OR COALESCE(s.min_rating < :min_series_average_rating, 0))",
+                  lambda e: f"Series contains books with rating less than {MIN_SERIES_AVERAGE_RATING}",
+                  marks_uninterested=True),
+    CandidateRule('series_already_rated',
+                  "sr.series IS NOT NULL",
+                  lambda e: "Series already rated"),
+    CandidateRule('not_enough_pages',
+                  "NOT (COALESCE(b.pages_reported_by_kindle, 0) >= :min_pages OR COALESCE(s.total_pages, 0) >= :min_pages)",
+                  _explain_pages),
+    CandidateRule('not_enough_ratings',
+                  "NOT (COALESCE(b.number_of_ratings, 0) >= :min_ratings OR COALESCE(s.total_ratings, 0) >= :min_ratings)",
+                  _explain_ratings),
+]
+
+class CandidateEvaluation:
+    """ A book and the rule that rejected it (None if it's a candidate). """
+    def __init__(self, book, rejected_by, series_pages, series_ratings, min_pages, min_ratings):
+        self.book = book
+        self.rejected_by = rejected_by
+        self.series_pages = series_pages
+        self.series_ratings = series_ratings
+        self.min_pages = min_pages
+        self.min_ratings = min_ratings
+
+    @property
+    def is_candidate(self):
+        return self.rejected_by is None
+
+    def explanation(self):
+        if self.rejected_by is None:
+            return "Passed all filters"
+        return self.rejected_by.explain(self)
+
+class CandidateFilter:
+    """
+    The rate-continuous filters (shared with theme_scan_lib.recommendable_books), compiled into
+    one SQL query: series totals come from the series_stats table, series ratings are
+    aggregated once per series, and each book is tagged with the first rule that rejects it.
+    """
+    QUERY = '''
+        WITH series_ratings AS (
+            SELECT series, MAX(tier = 'F' OR interested = 0) AS f_tier_or_uninterested
+            FROM book_ratings
+            WHERE series IS NOT NULL AND series != ''
+            GROUP BY series
+        )
+        SELECT * FROM (
+            SELECT {book_columns}, s.total_pages, s.total_ratings,
+                   CASE {rule_cases} END AS rejected_by
+            FROM books b
+            LEFT JOIN series_stats s ON s.series = NULLIF(b.series, '')
+            LEFT JOIN series_ratings sr ON sr.series = NULLIF(b.series, '')
+            WHERE {scope}
+        )
+        {candidates_only}
+        ORDER BY id'''
+
+    def __init__(self, min_pages, min_ratings, rules=RULES):
+        self.min_pages = min_pages
+        self.min_ratings = min_ratings
+        self.rules = list(rules)
+
+    def _sql(self, author, series, candidates_only):
+        scope = ["1"]
+        if author:
+            scope.append("instr(b.author, :author) > 0")
+        if series:
+            scope.append("b.series IS NOT NULL AND instr(lower(b.series), lower(:series)) > 0")
+        return self.QUERY.format(
+            book_columns=", ".join(f"b.{column}" for column in BOOK_COLUMNS.split(",")),
+            rule_cases=" ".join(f"WHEN {rule.sql} THEN '{rule.name}'" for rule in self.rules),
+            scope=" AND ".join(scope),
+            candidates_only="WHERE rejected_by IS NULL" if candidates_only else "",
+        )
+
+    def evaluate(self, author=None, series=None, candidates_only=False, books_by_id=None):
+        """
+        CandidateEvaluations for every book (optionally only books whose author contains
+        `author` / whose series contains `series`), or only the candidates. Books are taken
+        from `books_by_id` when given, so callers keep working with their loaded objects.
+        """
+        params = {
+            'min_pages': self.min_pages,
+            'min_ratings': self.min_ratings,
+            'min_ratings_for_low_rating': MIN_RATINGS_FOR_LOW_RATING,
+            'min_series_average_rating': MIN_SERIES_AVERAGE_RATING,
+            'author': author,
+            'series': series,
+        }
+        cur = db.connection().execute(self._sql(author, series, candidates_only), params)
+        rules_by_name = {rule.name: rule for rule in self.rules}
+        evaluations = []
+        for row in cur.fetchall():
+            book = books_by_id.get(row[0]) if books_by_id is not None else None
+            if book is None:
+                book = Book.from_row(row)
+            total_pages, total_ratings, rejected_by = row[-3:]
+            evaluations.append(CandidateEvaluation(
+                book=book,
+                rejected_by=rules_by_name[rejected_by] if rejected_by else None,
+                series_pages=total_pages or 0,
+                series_ratings=total_ratings or 0,
+                min_pages=self.min_pages,
+                min_ratings=self.min_ratings,
+            ))
+        return evaluations
+
+    def candidates(self, **kwargs):
+        return [evaluation.book for evaluation in self.evaluate(candidates_only=True, **kwargs)]
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import json
+from datetime import datetime, timezone
+import db
+from batch_writer import BatchWriter
+from utils import content_hash
+
+DB_NAME = db.DB_NAME
+
+UPSERT_CLASSIFICATION_SQL = '''INSERT INTO classifications
+                               (book_id, profile_version, description_hash, model, llm_fit, predicted_tier, reasoning, classified_at)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                               ON CONFLICT(book_id, profile_version) DO UPDATE SET
+                               description_hash = excluded.description_hash, model = excluded.model, llm_fit = excluded.llm_fit,
+                               predicted_tier = excluded.predicted_tier, reasoning = excluded.reasoning,
+                               classified_at = excluded.classified_at'''
+DELETE_TAGS_SQL = "DELETE FROM classification_tags WHERE book_id = ? AND profile_version = ?"
+INSERT_TAG_SQL = "INSERT OR IGNORE INTO classification_tags(book_id, profile_version, tag, position) VALUES (?, ?, ?, ?)"
+
+def profile_version(profile):
+    """
+    Hash of the parts of the profile that go into the classification prompt (summary and
+    taxonomy), so editing weights or regenerating the same taxonomy keeps classifications.
+    """
+    return content_hash(json.dumps({"summary": profile.get("summary", ""), "taxonomy": profile["taxonomy"]}, sort_keys=True))
+
+# Why a book needs (re)classifying, see ClassificationStore.reclassify_reasons.
+NEW = "new"
+TAXONOMY_CHANGED = "taxonomy changed"
+DESCRIPTION_CHANGED = "description changed"
+MODEL_CHANGED = "model changed"
+
+class ClassificationStore:
+    """
+    Claude's classifications (tags, fit, predicted tier, reasoning) for one profile version, in
+    the classifications / classification_tags tables. Classifications are dicts keyed like
+    classify_and_rank.classify_batch's output.
+
+    Each classification records its inputs: the profile version, the hash of the description
+    and the model. One is only redone when any of them changed.
+    """
+    def __init__(self, profile_version, db_name=DB_NAME):
+        self.profile_version = profile_version
+        self.db_name = db_name
+
+    def load(self):
+        """ Classifications by book id. """
+        conn = db.connection(self.db_name)
+        classifications = {}
+        cur = conn.execute('''SELECT book_id, llm_fit, predicted_tier, reasoning, description_hash, model
+                              FROM classifications WHERE profile_version = ?''', (self.profile_version,))
+        for book_id, llm_fit, predicted_tier, reasoning, description_hash, model in cur:
+            classifications[book_id] = {
+                "tags": [],
+                "llm_fit": llm_fit,
+                "predicted_tier": predicted_tier,
+                "reasoning": reasoning,
+                "description_hash": description_hash,
+                "model": model,
+            }
+        cur = conn.execute('''SELECT book_id, tag FROM classification_tags
+                              WHERE profile_version = ? ORDER BY book_id, position''', (self.profile_version,))
+        for book_id, tag in cur:
+            if book_id in classifications:
+                classifications[book_id]["tags"].append(tag)
+        return classifications
+
+    def reclassify_reasons(self, description_hashes, model):
+        """
+        For the books in `description_hashes` (current description hash by book id), why each
+        needs classifying with `model` (NEW, TAXONOMY_CHANGED, ...), or None if it's up to date.
+        Classifications from before models were recorded count as made with any model.
+        """
+        conn = db.connection(self.db_name)
+        ids = json.dumps(list(description_hashes))
+        inputs = {row[0]: row[1:] for row in conn.execute(
+            '''SELECT book_id, description_hash, model FROM classifications
+               WHERE profile_version = ? AND book_id IN (SELECT value FROM json_each(?))''', (self.profile_version, ids))}
+        classified_before = {row[0] for row in conn.execute(
+            '''SELECT DISTINCT book_id FROM classifications
+               WHERE profile_version != ? AND book_id IN (SELECT value FROM json_each(?))''', (self.profile_version, ids))}
+        reasons = {}
+        for book_id, description_hash in description_hashes.items():
+            if book_id not in inputs:
+                reasons[book_id] = TAXONOMY_CHANGED if book_id in classified_before else NEW
+            elif inputs[book_id][0] != description_hash:
+                reasons[book_id] = DESCRIPTION_CHANGED
+            elif inputs[book_id][1] not in (None, model):
+                reasons[book_id] = MODEL_CHANGED
+            else:
+                reasons[book_id] = None
+        return reasons
+
+    def count(self):
+        return db.connection(self.db_name).execute(
+            "SELECT COUNT(*) FROM classifications WHERE profile_version = ?", (self.profile_version,)).fetchone()[0]
+
+    def put_batch(self, classifications, description_hashes, model):
+        """
+        Upsert a batch of classifications (by book id) made by `model` in one transaction,
+        replacing their tags. `description_hashes` are the hashes of the descriptions they were
+        made from, by book id.
+        """
+        classified_at = datetime.now(timezone.utc).isoformat()
+        with BatchWriter(self.db_name, max_pending=float("inf"), max_pending_seconds=float("inf")) as writer:
+            for book_id, c in classifications.items():
+                writer.add(UPSERT_CLASSIFICATION_SQL, (book_id, self.profile_version, description_hashes[book_id], model, c.get("llm_fit"),
+                                                       c.get("predicted_tier"), c.get("reasoning"), classified_at))
+            for book_id in classifications:
+                writer.add(DELETE_TAGS_SQL, (book_id, self.profile_version))
+            for book_id, c in classifications.items():
+                for position, tag in enumerate(c.get("tags", [])):
+                    writer.add(INSERT_TAG_SQL, (book_id, self.profile_version, tag, position))
@@ -4,28 +4,38 @@
   python3 classify_and_rank.py                 # classify via claude, then write ranking
   python3 classify_and_rank.py --limit 20      # smoke test on the 20 most-rated candidates
   python3 classify_and_rank.py --rerank        # recompute scores from edited weights only (no claude)
+  python3 classify_and_rank.py --dry-run       # report how many claude calls a run would make, then stop
 
-Reads theme_profile.json (run build_profile.py first) and descriptions_cache.json.
-Writes classifications.json (cache of claude output) and recommendations.md.
+Books are only (re)classified when their description, the profile's summary / taxonomy or
+the model changed since their last classification.
+
+Reads theme_profile.json (run build_profile.py first) and the descriptions stored in books.db.
+Stores claude's classifications in books.db (one batch per transaction) and writes recommendations.html / .md.
 """
 import argparse
 import html
 import json
 import logging
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 
 import theme_scan_lib as lib
-from book import Book, BooksBySeries
+from book import SeriesStats
+from book_repository import BookRepository
+from description_store import DescriptionStore
+from utils import content_hash
 from book_rating import BookRating
+from classification_store import ClassificationStore, NEW, TAXONOMY_CHANGED, DESCRIPTION_CHANGED, MODEL_CHANGED, profile_version
 
 PROFILE_JSON = "theme_profile.json"
-CLASSIFICATIONS_JSON = "classifications.json"
 RECOMMENDATIONS_MD = "recommendations.md"
 RECOMMENDATIONS_HTML = "recommendations.html"
 
 DESC_CHARS = 700
 BATCH_SIZE = 10
+# Rough prompt-size estimate for --dry-run.
+CHARS_PER_TOKEN = 4
 TIER_RANK = {"S": 4, "A": 3, "B": 2, "F": 0}
 
 # How strongly the Goodreads start-of-series rating factors into the score.
@@ -52,11 +62,11 @@ Respond with ONLY valid JSON (no prose, no fences): a JSON array where each elem
 """
 
 
-def build_batch_prompt(profile, batch, cache):
+def build_batch_prompt(profile, batch, descriptions):
     taxonomy = "\n".join(f"- {t['tag']}: {t['description']}" for t in profile["taxonomy"])
     book_blocks = []
     for book in batch:
-        desc = lib.get_description(cache, book.id) or ""
+        desc = descriptions.description(book.id) or ""
         if len(desc) > DESC_CHARS:
             desc = desc[:DESC_CHARS].rsplit(" ", 1)[0] + "..."
         series = f" [series: {book.series}]" if book.series else ""
@@ -68,13 +78,13 @@ def build_batch_prompt(profile, batch, cache):
     )
 
 
-def classify_batch(profile, batch, cache, model):
-    prompt = build_batch_prompt(profile, batch, cache)
+def classify_batch(profile, batch, descriptions, model):
+    prompt = build_batch_prompt(profile, batch, descriptions)
     raw = lib.call_claude(prompt, model=model, timeout=300)
     results = lib.parse_json_response(raw)
     out = {}
     for r in results:
-        out[str(r["id"])] = {
+        out[int(r["id"])] = {
             "tags": r.get("tags", []),
             "llm_fit": r.get("fit"),
             "predicted_tier": r.get("tier"),
@@ -242,7 +252,8 @@ t.querySelectorAll('th').forEach((th, i) => th.addEventListener('click', () => {
   renumber();
 }));
 
-// Filtering.
+// Filtering. descriptionMatches is set by the server page's full-text search over descriptions.
+let descriptionMatches = null;
 const F = {
   text: document.getElementById('f-text'), score: document.getElementById('f-score'),
   year: document.getElementById('f-year'), hidef: document.getElementById('f-hidef'),
@@ -256,7 +267,8 @@ function applyFilters() {
   allRows().forEach(r => {
     const d = r.dataset;
     let ok = true;
-    if (q && !d.text.includes(q) && !r.querySelector('.why').textContent.toLowerCase().includes(q)) ok = false;
+    if (q && !d.text.includes(q) && !r.querySelector('.why').textContent.toLowerCase().includes(q)
+        && !(descriptionMatches && descriptionMatches.has(parseInt(d.id)))) ok = false;
     if (ok && parseFloat(d.score) < minScore) ok = false;
     if (ok && F.hidef.checked && d.tier === 'F') ok = false;
     if (ok && tierWant && d.tier !== tierWant) ok = false;
@@ -376,12 +388,18 @@ def _now_excluded(book, ratings):
     return False
 
 
-def compute_rows(profile, classifications, books_by_id, ratings=None,
+def compute_rows(profile, classifications, repo, ratings=None,
                  series_aware=False, rating_weight=RATING_WEIGHT):
-    """Build the ranked rows. Score = theme fit + rating term (from the start rating)."""
+    """Build the ranked rows. Score = theme fit + rating term (from the start rating).
+
+    Only the classified books and the other books in their series are loaded from `repo`
+    (a BookRepository).
+    """
     weights = profile["weights"]
-    bbs = BooksBySeries.from_books(books_by_id.values())
-    cache = lib.load_cache()
+    books_by_id = repo.by_ids(int(bid) for bid in classifications)
+    series_stats = SeriesStats.load_for_series({b.series for b in books_by_id.values() if b.series})
+    books_by_id.update(repo.by_ids(i for stats in series_stats.values() for i in stats.member_ids))
+    publication_by_id = DescriptionStore().get_many(books_by_id)
     rows = []
     for bid, c in classifications.items():
         book = books_by_id.get(int(bid))
@@ -389,16 +407,17 @@ def compute_rows(profile, classifications, books_by_id, ratings=None,
             continue
         if _now_excluded(book, ratings):
             continue
-        if book.series:
-            pages = bbs.total_pages_reported_by_kindle_for_series(book.series)
-            num_ratings = bbs.total_number_of_ratings_for_series(book.series)
-            series_books = bbs.books_by_series[book.series]
+        stats = series_stats.get(book.series) if book.series else None
+        if stats:
+            pages = stats.total_pages
+            num_ratings = stats.total_ratings
+            series_books = [books_by_id[i] for i in stats.member_ids if i in books_by_id]
             series_ratings = [
                 (sb.series_number, sb.average_rating or 0, sb.number_of_ratings or 0)
                 for sb in series_books
             ]
             # The "start" rating is the earliest volume's — the entry point the reader judges.
-            start_rating = series_books[0].average_rating or 0
+            start_rating = stats.start_rating
         else:
             pages = book.pages_reported_by_kindle or 0
             num_ratings = book.number_of_ratings or 0
@@ -407,7 +426,7 @@ def compute_rows(profile, classifications, books_by_id, ratings=None,
 
         fit = fit_score(c["tags"], weights)
         rating_term = round(rating_weight * (start_rating - RATING_BASELINE), 2)
-        entry = cache.get(str(book.id), {})
+        entry = publication_by_id.get(book.id, {})
         rows.append({
             "book": book,
             "tags": c["tags"],
@@ -434,9 +453,9 @@ def compute_rows(profile, classifications, books_by_id, ratings=None,
     return rows
 
 
-def rank_and_write(profile, classifications, books_by_id, series_aware=False, fmt="html",
+def rank_and_write(profile, classifications, repo, series_aware=False, fmt="html",
                    ratings=None, rating_weight=RATING_WEIGHT):
-    rows = compute_rows(profile, classifications, books_by_id, ratings=ratings,
+    rows = compute_rows(profile, classifications, repo, ratings=ratings,
                         series_aware=series_aware, rating_weight=rating_weight)
     if fmt == "md":
         write_md(profile, rows, len(rows))
@@ -453,6 +472,7 @@ def main():
     parser.add_argument("--limit", type=int, default=0, help="classify only the N most-rated candidates (0 = all)")
     parser.add_argument("--min-pages", type=int, default=500, help="min pages (book or series) filter")
     parser.add_argument("--rerank", action="store_true", help="recompute scores from edited weights; no claude calls")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be classified and how many claude calls it takes; no claude calls")
     parser.add_argument("--series-aware", action="store_true", help="collapse each series to its single best-ranked book")
     parser.add_argument("--format", choices=["html", "md"], default="html", help="output format (default html)")
     parser.add_argument("--rating-weight", type=float, default=RATING_WEIGHT,
@@ -464,23 +484,22 @@ def main():
     with open(PROFILE_JSON) as f:
         profile = json.load(f)
 
-    books = Book.load_books_from_db()
-    books_by_id = {b.id: b for b in books}
+    repo = BookRepository()
     ratings = BookRating.load_ratings_from_db()
+    classifications = ClassificationStore(profile_version(profile))
 
     if args.rerank:
-        with open(CLASSIFICATIONS_JSON) as f:
-            classifications = json.load(f)
-        rows = rank_and_write(profile, classifications, books_by_id,
+        rows = rank_and_write(profile, classifications.load(), repo,
                               series_aware=args.series_aware, fmt=args.format, ratings=ratings,
                               rating_weight=args.rating_weight)
         logging.info(f"Re-ranked {len(rows)} books from edited weights -> {out_file}")
         return
 
-    cache = lib.load_cache()
+    descriptions = DescriptionStore()
 
-    recommendable = lib.recommendable_books(books, ratings, min_pages=args.min_pages)
-    candidates = [b for b in recommendable if lib.get_description(cache, b.id)]
+    recommendable = lib.recommendable_books(min_pages=args.min_pages)
+    described = descriptions.described_ids(b.id for b in recommendable)
+    candidates = [b for b in recommendable if b.id in described]
     missing_desc = len(recommendable) - len(candidates)
     if missing_desc:
         logging.warning(
@@ -491,41 +510,43 @@ def main():
     if args.limit:
         candidates = candidates[:args.limit]
 
-    # Resume: keep any classifications we already have.
-    try:
-        with open(CLASSIFICATIONS_JSON) as f:
-            classifications = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        classifications = {}
-
-    todo = [b for b in candidates if str(b.id) not in classifications]
+    # Resume: keep every classification whose inputs haven't changed.
+    description_hashes = {book_id: content_hash(entry["description"])
+                          for book_id, entry in descriptions.get_many(b.id for b in candidates).items()}
+    reasons = classifications.reclassify_reasons(description_hashes, args.model)
+    todo = [b for b in candidates if reasons.get(b.id)]
+    reason_counts = Counter(reasons[b.id] for b in todo)
+    batches = [todo[i:i + BATCH_SIZE] for i in range(0, len(todo), BATCH_SIZE)]
     logging.info(
         f"{len(candidates)} candidates with descriptions; {len(todo)} to classify "
-        f"({len(candidates) - len(todo)} already done) via claude ({args.model})."
+        f"({len(candidates) - len(todo)} up to date) via claude ({args.model}): "
+        + ", ".join(f"{reason_counts[reason]} {reason}" for reason in (NEW, TAXONOMY_CHANGED, DESCRIPTION_CHANGED, MODEL_CHANGED))
+        + f" -> {len(batches)} claude calls of up to {BATCH_SIZE} books."
     )
+    if args.dry_run:
+        prompt_chars = sum(len(build_batch_prompt(profile, batch, descriptions)) for batch in batches)
+        logging.info(f"Dry run: ~{prompt_chars // CHARS_PER_TOKEN:,} prompt tokens over {len(batches)} calls, nothing classified.")
+        return
 
-    batches = [todo[i:i + BATCH_SIZE] for i in range(0, len(todo), BATCH_SIZE)]
     done = 0
     with ThreadPoolExecutor(max_workers=args.workers) as ex:
-        futures = {ex.submit(classify_batch, profile, batch, cache, args.model): batch for batch in batches}
+        futures = {ex.submit(classify_batch, profile, batch, descriptions, args.model): batch for batch in batches}
         for fut in as_completed(futures):
             try:
-                classifications.update(fut.result())
+                # Each batch is stored as soon as it's back, so a crash loses at most the batches in flight.
+                results = fut.result()
+                classifications.put_batch({book_id: c for book_id, c in results.items() if book_id in description_hashes},
+                                          description_hashes, args.model)
             except Exception as e:
                 logging.warning(f"Batch failed: {e}")
             done += 1
             if done % 5 == 0 or done == len(batches):
-                with open(CLASSIFICATIONS_JSON, "w") as f:
-                    json.dump(classifications, f, indent=2)
                 logging.info(f"  ...{done}/{len(batches)} batches classified")
 
-    with open(CLASSIFICATIONS_JSON, "w") as f:
-        json.dump(classifications, f, indent=2)
-
-    rows = rank_and_write(profile, classifications, books_by_id,
+    rows = rank_and_write(profile, classifications.load(), repo,
                           series_aware=args.series_aware, fmt=args.format, ratings=ratings,
                           rating_weight=args.rating_weight)
-    logging.info(f"Classified {len(classifications)} books. Wrote {out_file} ({len(rows)} ranked).")
+    logging.info(f"Classified {classifications.count()} books. Wrote {out_file} ({len(rows)} ranked).")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import migrations
+
+# Books, ratings and refresh metadata, see migrations.py for the schema.
+DB_NAME = "books.db"
+
+# WAL lets readers (e.g. serve_recommendations) keep reading while a refresh writes, and with
+# WAL synchronous=NORMAL only fsyncs at checkpoints while still never corrupting the DB.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -32000",  # KiB, i.e. 32MB
+    "PRAGMA mmap_size = 268435456",  # 256MB
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",  # ms to wait on another writer instead of failing
+    "PRAGMA recursive_triggers = ON",  # so INSERT OR REPLACE fires delete triggers (series_stats)
+)
+
+_local = threading.local()
+_all_connections = []
+_all_connections_lock = threading.Lock()
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+def connection(db_name=DB_NAME):
+    """
+    The calling thread's long-lived connection to `db_name`, opened (and configured with
+    PRAGMAS) on first use and closed at exit. Don't close it; commit as usual. The books DB is
+    migrated to the latest schema the first time it's opened in the process.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = os.path.abspath(db_name)
+    conn = connections.get(key)
+    if conn is None:
+        # check_same_thread=False only so close_all() can close it at exit, it's never shared.
+        conn = sqlite3.connect(db_name, check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        if key == os.path.abspath(DB_NAME):
+            with _migrate_lock:
+                if key not in _migrated:
+                    migrations.migrate(conn)
+                    _migrated.add(key)
+        connections[key] = conn
+        with _all_connections_lock:
+            _close_connections_of_finished_threads()
+            _all_connections.append((threading.current_thread(), conn))
+        logging.debug(f"Opened {db_name} on thread {threading.current_thread().name}.")
+    return conn
+
+def _close_connections_of_finished_threads():
+    # E.g. ThreadingHTTPServer handles every request on a new thread.
+    alive = []
+    for thread, conn in _all_connections:
+        if thread.is_alive():
+            alive.append((thread, conn))
+        else:
+            conn.close()
+    _all_connections[:] = alive
+
+def close_all():
+    with _all_connections_lock:
+        connections = [conn for _, conn in _all_connections]
+        _all_connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logging.error(e)
+
+atexit.register(close_all)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+import json
+import db
+
+DB_NAME = db.DB_NAME
+
+ENTRY_COLUMNS = ("description", "goodreads_link", "published_raw", "published_date", "published_year", "fetched_at")
+
+UPSERT_DESCRIPTION_SQL = f'''INSERT INTO descriptions(book_id, {", ".join(ENTRY_COLUMNS)})
+                            VALUES (?, {", ".join("?" for _ in ENTRY_COLUMNS)})
+                            ON CONFLICT(book_id) DO UPDATE SET
+                            {", ".join(f"{column} = excluded.{column}" for column in ENTRY_COLUMNS)}'''
+
+def _fts_query(text):
+    """ Each word of `text` as a quoted prefix term, so user input can't be read as FTS5 syntax. """
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in text.split())
+
+class DescriptionStore:
+    """
+    Goodreads descriptions and publication dates by book id, stored in the descriptions table
+    (with a full-text index, see migrations._create_descriptions). Entries are dicts with the
+    ENTRY_COLUMNS keys, read only for the ids asked for.
+    """
+    def __init__(self, db_name=DB_NAME):
+        self.db_name = db_name
+
+    def _select(self, where, params):
+        cur = db.connection(self.db_name).execute(
+            f"SELECT book_id, {', '.join(ENTRY_COLUMNS)} FROM descriptions WHERE {where}", params)
+        return {row[0]: dict(zip(ENTRY_COLUMNS, row[1:])) for row in cur}
+
+    def get(self, book_id):
+        return self._select("book_id = ?", (book_id,)).get(book_id)
+
+    def get_many(self, book_ids):
+        """ Entries by book id, for the ids that have one. """
+        return self._select("book_id IN (SELECT value FROM json_each(?))", (json.dumps(list(book_ids)),))
+
+    def description(self, book_id):
+        row = db.connection(self.db_name).execute("SELECT description FROM descriptions WHERE book_id = ?", (book_id,)).fetchone()
+        return row[0] if row else None
+
+    def described_ids(self, book_ids):
+        """ The subset of `book_ids` that have a stored description. """
+        cur = db.connection(self.db_name).execute(
+            "SELECT book_id FROM descriptions WHERE book_id IN (SELECT value FROM json_each(?))", (json.dumps(list(book_ids)),))
+        return {row[0] for row in cur}
+
+    def put(self, book_id, entry, writer=None):
+        """ Insert or update one entry, queued on `writer` (a BatchWriter) if given. """
+        params = (book_id, *(entry.get(column) for column in ENTRY_COLUMNS))
+        if writer is not None:
+            writer.add(UPSERT_DESCRIPTION_SQL, params)
+            return
+        conn = db.connection(self.db_name)
+        conn.execute(UPSERT_DESCRIPTION_SQL, params)
+        conn.commit()
+
+    def search(self, text, limit=500):
+        """ Ids of books whose description matches every word of `text` (as prefixes), best match first. """
+        query = _fts_query(text)
+        if not query:
+            return []
+        cur = db.connection(self.db_name).execute(
+            "SELECT rowid FROM descriptions_fts WHERE descriptions_fts MATCH ? ORDER BY rank LIMIT ?", (query, limit))
+        return [row[0] for row in cur]
@@ -1,42 +1,100 @@
 #!/usr/bin/env python3
+import asyncio
+import atexit
+import aiohttp
 import requests
 import time
 import json
 import os
-from bs4 import BeautifulSoup
+import hashlib
+import sqlite3
+import threading
+import html
+from bs4 import BeautifulSoup, SoupStrainer
 import logging
 from fuzzywuzzy import fuzz
 from urllib.parse import urlparse
+from concurrent.futures import as_completed
+from http.cookies import SimpleCookie
+from yarl import URL
 import re
 import pprint as pp
+from collections import OrderedDict, defaultdict
 from utils import stripped_title, stripped
 
 # Goodreads now sits behind an AWS WAF JavaScript challenge (responds with HTTP 202 and
-# x-amzn-waf-action: challenge). Plain `requests` can't solve it, so we use a headless
+# x-amzn-waf-action: challenge). A plain HTTP client can't solve it, so we use a headless
 # browser once to mint an `aws-waf-token` cookie and reuse it across requests. The token
 # is bound to the User-Agent, so the same UA must be used everywhere.
 _USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 _WAF_COOKIE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".goodreads_waf_cookies.json")
-_session = None
+# Default headers to mimic a browser.
+_DEFAULT_HEADERS = {
+    'User-Agent': _USER_AGENT,
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'DNT': '1',  # Do Not Track Request Header
+    'Upgrade-Insecure-Requests': '1',
+}
 
+# Every request in the process goes through one connection pool: at most this many open
+# connections overall, and per host.
+_MAX_CONNECTIONS = 16
+_MAX_CONNECTIONS_PER_HOST = 6
+_REQUEST_TIMEOUT_SECONDS = 30
 
-def _apply_cookies(session, cookies):
+# Requests to Goodreads are paced by a token bucket whose rate adapts (AIMD) to how Goodreads
+# responds: it creeps up while requests succeed and halves on a WAF challenge, 5xx or dropped
+# connection. The learned rate is saved so the next run starts near it.
+_RATE_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".goodreads_rate.json")
+_RATE_LIMITED_HOSTS = ('goodreads.com',)
+_INITIAL_REQUESTS_PER_SECOND = 2.0
+_MIN_REQUESTS_PER_SECOND = 0.2
+_MAX_REQUESTS_PER_SECOND = 10.0
+_RATE_INCREASE_PER_SUCCESS = 0.02
+_RATE_DECREASE_FACTOR = 0.5
+# Concurrent requests tend to fail together; only back off once per this many seconds.
+_RATE_DECREASE_COOLDOWN_SECONDS = 2.0
+
+# Goodreads pages are cached on disk so repeated runs don't re-download (and re-trigger the WAF
+# on) pages fetched recently. Bodies are stored content-addressed (by sha256) next to a small
+# SQLite index of url -> body, validators and timestamps.
+_HTTP_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".goodreads_http_cache")
+_HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# How long a cached page is served without asking Goodreads again, by kind of page. Once
+# expired, the page is revalidated with If-None-Match / If-Modified-Since.
+_HTTP_CACHE_TTLS = [
+    (re.compile(r'^https://www\.goodreads\.com/book/show/'), 24 * 60 * 60),
+    (re.compile(r'^https://www\.goodreads\.com/series/'), 24 * 60 * 60),
+    (re.compile(r'^https://www\.goodreads\.com/search\?'), 7 * 24 * 60 * 60),
+]
+# Resolved searches (the book page a title / author search settled on, or no match) are kept
+# longer than the search pages themselves. A miss expires sooner, new releases are often added
+# to Goodreads a few days late.
+_SEARCH_CACHE_PATH = os.path.join(_HTTP_CACHE_DIR, "searches.db")
+_SEARCH_MATCH_TTL = 180 * 24 * 60 * 60
+_SEARCH_NO_MATCH_TTL = 7 * 24 * 60 * 60
+
+
+def _apply_cookies(cookie_jar, cookies):
     for cookie in cookies:
-        session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'))
+        morsels = SimpleCookie()
+        morsels[cookie['name']] = cookie['value']
+        domain = cookie.get('domain') or 'www.goodreads.com'
+        morsels[cookie['name']]['domain'] = domain
+        morsels[cookie['name']]['path'] = cookie.get('path') or '/'
+        cookie_jar.update_cookies(morsels, response_url=URL(f"https://{domain.lstrip('.')}/"))
 
 
-def _get_session():
-    """Return a process-wide session, seeded with any WAF cookies cached from a previous run."""
-    global _session
-    if _session is None:
-        _session = requests.Session()
-        if os.path.exists(_WAF_COOKIE_FILE):
-            try:
-                with open(_WAF_COOKIE_FILE) as f:
-                    _apply_cookies(_session, json.load(f))
-            except (json.JSONDecodeError, OSError):
-                pass
-    return _session
+def _load_waf_cookies():
+    """WAF cookies cached from a previous run, if any."""
+    if not os.path.exists(_WAF_COOKIE_FILE):
+        return []
+    try:
+        with open(_WAF_COOKIE_FILE) as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return []
 
 
 def _is_waf_challenge(response):
@@ -67,7 +125,275 @@ def _solve_waf_challenge(url):
         pass
     return cookies
 
+# HTML parser backend used for all scraping. lxml is several times faster than the stdlib parser;
+# set GOODREADS_HTML_PARSER=html.parser (or call set_html_parser) to force the stdlib one.
+def _default_html_parser():
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+_html_parser = os.environ.get('GOODREADS_HTML_PARSER') or _default_html_parser()
+
+
+def set_html_parser(name):
+    """Select the BeautifulSoup parser backend ('lxml', 'html.parser', ...) used for scraping."""
+    global _html_parser
+    _html_parser = name
+
+
+class TargetedStrainer(SoupStrainer):
+    """
+    Only build the parts of a page we read: top-level tags for which `match(name, attrs)` is
+    true are kept along with their whole subtree, everything else is dropped while parsing.
+
+    `attrs` is a dict of raw attribute strings (so `class` is the space-separated string).
+    """
+    def __init__(self, match):
+        # Any name rule, so BeautifulSoup discards the strings between kept tags.
+        super().__init__(name=True)
+        self._match = match
+
+    def _matches(self, name, attrs):
+        attrs = {k: " ".join(v) if isinstance(v, list) else v for k, v in (attrs or {}).items()}
+        return self._match(name, attrs)
+
+    # beautifulsoup4 >= 4.13
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self._matches(name, attrs)
+
+    # beautifulsoup4 < 4.13
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        return markup_name if self._matches(markup_name, markup_attrs) else None
+
+
+def _classes(attrs):
+    return attrs.get('class', '').split()
+
+_SERIES_H3_CLASS = 'Text Text__title3 Text__italic Text__regular Text__subdued'
+_BOOK_PAGE_TESTIDS = {'bookTitle', 'ratingsCount', 'pagesFormat', 'description', 'publicationInfo'}
+BOOK_PAGE_STRAINER = TargetedStrainer(
+    lambda name, attrs: attrs.get('data-testid') in _BOOK_PAGE_TESTIDS
+    or (name == 'a' and 'ContributorLink' in _classes(attrs))
+    or (name == 'div' and 'RatingStatistics__rating' in _classes(attrs))
+    or (name == 'h3' and 'Text__title3' in _classes(attrs)))
+SERIES_PAGE_STRAINER = TargetedStrainer(
+    lambda name, attrs: name == 'div' and 'listWithDividers__item' in _classes(attrs))
+SEARCH_PAGE_STRAINER = TargetedStrainer(
+    lambda name, attrs: name == 'tr' and attrs.get('itemtype') == 'http://schema.org/Book')
+
+
+def parse_html(markup, parse_only=None, parser=None):
+    """Parse `markup` with the selected backend, optionally keeping only what `parse_only` matches."""
+    return BeautifulSoup(markup, parser or _html_parser, parse_only=parse_only)
+
+
+def _normalized_url(url):
+    """Canonical form of `url` used as a cache key (collapses duplicate slashes in the path)."""
+    parsed_url = urlparse(url)
+    path = re.sub(r'/+', '/', parsed_url.path)
+    query = f"?{parsed_url.query}" if parsed_url.query else ""
+    return f"{parsed_url.scheme}://{parsed_url.netloc}{path}{query}"
+
+
+def _cache_ttl_for_url(url):
+    """Seconds a cached response for `url` stays fresh, or None if the url shouldn't be cached."""
+    for pattern, ttl in _HTTP_CACHE_TTLS:
+        if pattern.match(url):
+            return ttl
+    return None
+
+
+class CachedResponse:
+    def __init__(self, url, body, encoding, etag, last_modified, fetched_at):
+        self.url = url
+        self.body = body
+        self.encoding = encoding
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    def is_fresh(self, ttl):
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_response(self):
+        """Rebuild a `requests.Response` so callers can't tell a cache hit from a fetch."""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = self.url
+        response.encoding = self.encoding
+        response._content = self.body
+        response.from_cache = True
+        return response
+
+
+class ResponseCache:
+    """Size-bounded, LRU-evicted on-disk cache of successful Goodreads responses (thread-safe)."""
+    def __init__(self, directory=_HTTP_CACHE_DIR, max_bytes=_HTTP_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.directory, "index.db"), check_same_thread=False)
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS responses
+                                  (url TEXT PRIMARY KEY,
+                                   content_hash TEXT,
+                                   encoding TEXT,
+                                   etag TEXT,
+                                   last_modified TEXT,
+                                   size INTEGER,
+                                   fetched_at REAL,
+                                   last_used REAL)''')
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def _body_path(self, content_hash):
+        return os.path.join(self.directory, content_hash)
+
+    def get(self, url):
+        """Return the CachedResponse for `url` (fresh or not), or None."""
+        url = _normalized_url(url)
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT content_hash, encoding, etag, last_modified, fetched_at FROM responses WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            try:
+                with open(self._body_path(row[0]), 'rb') as f:
+                    body = f.read()
+            except OSError:
+                conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE url = ?", (time.time(), url))
+            conn.commit()
+        return CachedResponse(url, body, row[1], row[2], row[3], row[4])
+
+    def put(self, url, response):
+        url = _normalized_url(url)
+        body = response.content
+        content_hash = hashlib.sha256(body).hexdigest()
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            path = self._body_path(content_hash)
+            if not os.path.exists(path):
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, 'wb') as f:
+                    f.write(body)
+                os.replace(tmp, path)
+            old_row = conn.execute("SELECT content_hash FROM responses WHERE url = ?", (url,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO responses (url, content_hash, encoding, etag, last_modified, size, fetched_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (url, content_hash, response.encoding, response.headers.get('ETag'), response.headers.get('Last-Modified'), len(body), now, now))
+            if old_row and old_row[0] != content_hash:
+                self._delete_body_if_unreferenced(conn, old_row[0])
+            self._evict(conn)
+            conn.commit()
+
+    def discard(self, url):
+        url = _normalized_url(url)
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT content_hash FROM responses WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return
+            conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self._delete_body_if_unreferenced(conn, row[0])
+            conn.commit()
+
+    def mark_revalidated(self, url):
+        """Goodreads answered 304 Not Modified; the cached body is fresh again."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("UPDATE responses SET fetched_at = ?, last_used = ? WHERE url = ?", (now, now, _normalized_url(url)))
+            conn.commit()
+
+    def _delete_body_if_unreferenced(self, conn, content_hash):
+        if conn.execute("SELECT 1 FROM responses WHERE content_hash = ?", (content_hash,)).fetchone():
+            return
+        try:
+            os.remove(self._body_path(content_hash))
+        except OSError:
+            pass
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, content_hash, size in conn.execute("SELECT url, content_hash, size FROM responses ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self._delete_body_if_unreferenced(conn, content_hash)
+            total -= size
+
+
+_response_cache = ResponseCache()
+
+
+_NOT_CACHED = object()
+
+class SearchResolutionCache:
+    """On-disk cache of resolved Goodreads searches by query: the best match url, or None for no match (thread-safe)."""
+    def __init__(self, path=_SEARCH_CACHE_PATH, match_ttl=_SEARCH_MATCH_TTL, no_match_ttl=_SEARCH_NO_MATCH_TTL):
+        self.path = path
+        self.match_ttl = match_ttl
+        self.no_match_ttl = no_match_ttl
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS searches
+                                  (query TEXT PRIMARY KEY,
+                                   url TEXT,
+                                   resolved_at REAL)''')
+            self._conn.commit()
+        return self._conn
+
+    def get(self, query):
+        """The cached url (or None) for `query` while fresh, else _NOT_CACHED."""
+        with self._lock:
+            row = self._connection().execute("SELECT url, resolved_at FROM searches WHERE query = ?", (query,)).fetchone()
+        if row is None:
+            return _NOT_CACHED
+        url, resolved_at = row
+        ttl = self.match_ttl if url else self.no_match_ttl
+        return url if time.time() - resolved_at < ttl else _NOT_CACHED
+
+    def put(self, query, url):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO searches (query, url, resolved_at) VALUES (?, ?, ?)", (query, url, time.time()))
+            conn.commit()
+
+
+_search_cache = SearchResolutionCache()
+
+
+class GoodreadsParseError(AttributeError):
+    """A Goodreads page is missing the elements we scrape (usually it was only partially rendered)."""
+
 class GoodreadsBook:
+    __slots__ = ('title', 'author', 'pages_reported_by_kindle', 'goodreads_link', 'average_rating', 'number_of_ratings', 'series', 'series_number')
+
     def __init__(self, title, author, pages_reported_by_kindle, goodreads_link, average_rating, number_of_ratings, series, series_number):
         self.title = title
         self.author = author
@@ -78,11 +404,29 @@ class GoodreadsBook:
         self.series = series
         self.series_number = series_number
 
-def load_goodreads_book_from_url(url, max_retries=3, backoff_factor=0.5):
-    def fetch_data():
-        response = requests_get_with_retry(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+    def fields(self):
+        """ Every field by name, e.g. for comparing two parses of a page. """
+        return {name: getattr(self, name) for cls in type(self).__mro__ for name in getattr(cls, '__slots__', ())}
+
+class GoodreadsBookPage(GoodreadsBook):
+    """
+    Every field we read from a Goodreads book page, parsed from a single response.
+
+    Besides the GoodreadsBook fields this carries the series link, the description and the
+    raw publication info (e.g. "First published April 5, 2021"), which are None when the
+    page doesn't have them.
+    """
+    __slots__ = ('series_link', 'description', 'publication_info')
+
+    def __init__(self, series_link, description, publication_info, **kwargs):
+        super().__init__(**kwargs)
+        self.series_link = series_link
+        self.description = description
+        self.publication_info = publication_info
+
+    @classmethod
+    def from_html(cls, url, page_html, parser=None, parse_only=BOOK_PAGE_STRAINER):
+        soup = parse_html(page_html, parse_only=parse_only, parser=parser)
 
         # Extract the number of pages and kindle edition text
         pages_number = None
@@ -95,19 +439,23 @@ def load_goodreads_book_from_url(url, max_retries=3, backoff_factor=0.5):
         # Extract the title
         book_title_element = soup.find('h1', {'data-testid': 'bookTitle'})
         if not book_title_element:
-            raise AttributeError("Title element not found after retries")
+            raise GoodreadsParseError("Title element not found")
         book_title = book_title_element.text.strip()
 
         # Extract the author
         authors = set()
         for author_a_element in soup.find_all('a', {'class': 'ContributorLink'}):
-            authors.add(author_a_element.find('span', {'class': 'ContributorLink__name', 'data-testid': 'name'}).text)
+            author_name_element = author_a_element.find('span', {'class': 'ContributorLink__name', 'data-testid': 'name'})
+            if not author_name_element:
+                raise GoodreadsParseError("Author name element not found")
+            authors.add(author_name_element.text)
         author_text = ", ".join(authors)
         author = re.sub(r'\s+', ' ', author_text).strip()
-        # Extract the series if it exists
-        series_info = soup.find('h3', class_='Text Text__title3 Text__italic Text__regular Text__subdued')
+        # Extract the series (and its link) if it exists
+        series_info = soup.find('h3', class_=_SERIES_H3_CLASS)
         series_name = None
         series_number = None
+        series_link = None
         if series_info and 'aria-label' in series_info.attrs:
             series_text = series_info['aria-label']
             series_match = re.match(r'Book (.*) in the (.+) series', series_text)
@@ -116,6 +464,10 @@ def load_goodreads_book_from_url(url, max_retries=3, backoff_factor=0.5):
                 series_name = series_match.group(2)
             else:
                 logging.debug(f"Found unmatched series text: {series_text}, ignoring series information!")
+        if series_info:
+            series_link_element = series_info.find('a')
+            if series_link_element and 'href' in series_link_element.attrs:
+                series_link = series_link_element['href']
 
         # Extract the average rating
         average_rating_div = soup.find('div', class_='RatingStatistics__rating')
@@ -125,9 +477,16 @@ def load_goodreads_book_from_url(url, max_retries=3, backoff_factor=0.5):
         ratings_count_text = ratings_count_span.text.strip() if ratings_count_span else ''
         ratings_count_match = re.search(r'\d+', ratings_count_text.replace(',', ''))
         number_of_ratings = int(ratings_count_match.group()) if ratings_count_match else 0
+
+        # Extract the description and publication info
+        description_element = soup.find('div', {'data-testid': 'description'})
+        description = description_element.text if description_element else None
+        pub_element = soup.find('p', {'data-testid': 'publicationInfo'})
+        publication_info = pub_element.text.strip() if pub_element else None
+
         parsed_url = urlparse(url)
         stripped_url = f"{parsed_url.scheme}://{parsed_url.netloc}{parsed_url.path}"
-        return GoodreadsBook(
+        return cls(
             title=book_title, 
             author=author,
             pages_reported_by_kindle=pages_number, 
@@ -136,73 +495,169 @@ def load_goodreads_book_from_url(url, max_retries=3, backoff_factor=0.5):
             number_of_ratings=number_of_ratings,
             series=series_name,
             series_number=series_number,
+            series_link=series_link,
+            description=description,
+            publication_info=publication_info,
         )
 
-    return retry_with_backoff(fetch_data, max_retries, backoff_factor)
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key: the first caller runs `fn`, callers that
+    arrive while it is running wait and share its result (or exception).
+    """
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
 
-def find_book_on_goodreads(book):
-    # Use the search_result_for_book to get the best match
-    best_match = search_result_for_book(book)
-    if best_match:
-        return load_goodreads_book_from_url(best_match)
-    else:
-        return None
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
 
-def series_link_from_book(book, max_retries=3, backoff_factor=0.5):
-    def fetch_data():
-        response = requests_get_with_retry(book.goodreads_link)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
 
-        series_link_element = soup.find('h3', class_='Text Text__title3 Text__italic Text__regular Text__subdued').find('a')
-        if not series_link_element or 'href' not in series_link_element.attrs:
-            raise AttributeError("Series link element not found after retries")
-        return series_link_element['href']
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
 
-    return retry_with_backoff(fetch_data, max_retries, backoff_factor)
+# Parsed pages in flight, by normalized url, so concurrent workers expanding the same series
+# (or loading the same book) share one fetch and one parse.
+_parsed_page_flights = SingleFlight()
 
-def description_text_for_book(book, max_retries=3, backoff_factor=0.5):
-    def fetch_data():
-        response = requests_get_with_retry(book.goodreads_link)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+# Recently parsed book pages by normalized url, so asking for a second field of a book we just
+# loaded (e.g. its series link or description) doesn't fetch and parse the page again.
+_BOOK_PAGE_MEMO_SIZE = 256
+_book_page_memo = OrderedDict()
+_book_page_memo_lock = threading.Lock()
 
-        description_element = soup.find('div', {'data-testid': 'description'})
-        if not description_element:
-            raise AttributeError("Description element not found after retries")
-        return description_element.text
+def _memoized_book_page(url):
+    with _book_page_memo_lock:
+        memo_key = _normalized_url(url)
+        if memo_key in _book_page_memo:
+            _book_page_memo.move_to_end(memo_key)
+            return _book_page_memo[memo_key]
+    return None
 
-    return retry_with_backoff(fetch_data, max_retries, backoff_factor)
+def _memoize_book_page(url, page):
+    with _book_page_memo_lock:
+        _book_page_memo[_normalized_url(url)] = page
+        while len(_book_page_memo) > _BOOK_PAGE_MEMO_SIZE:
+            _book_page_memo.popitem(last=False)
 
-def description_and_pubdate_for_book(book, max_retries=3, backoff_factor=0.5):
-    """Fetch the book page once and return (description_text, publication_info_text).
+def load_goodreads_book_page(url, retry_state=None):
+    """Fetch and parse a Goodreads book page into a GoodreadsBookPage (one request, one parse)."""
+    page = _memoized_book_page(url)
+    if page is not None:
+        return page
 
-    publication_info_text is the raw Goodreads string (e.g. "First published April 5,
-    2021") or None if not present.
+    def load():
+        page = _memoized_book_page(url)
+        if page is None:
+            page = fetch_parsed(url, lambda response: GoodreadsBookPage.from_html(url, response.text), retry_state)
+            _memoize_book_page(url, page)
+        return page
+
+    return _parsed_page_flights.do(('book', _normalized_url(url)), load)
+
+def load_goodreads_book_pages(urls, concurrency=None):
+    """
+    Load many book pages concurrently over the shared fetcher, yielding (url, GoodreadsBookPage)
+    as each one arrives, or (url, exception) if it couldn't be loaded. Pages are parsed in the
+    calling thread.
     """
-    def fetch_data():
-        response = requests_get_with_retry(book.goodreads_link)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+    to_fetch = []
+    for url in urls:
+        page = _memoized_book_page(url)
+        if page is not None:
+            yield url, page
+        else:
+            to_fetch.append(url)
 
-        description_element = soup.find('div', {'data-testid': 'description'})
-        if not description_element:
-            raise AttributeError("Description element not found after retries")
+    for url, response in _fetcher.fetch_all(to_fetch, concurrency):
+        if isinstance(response, Exception):
+            yield url, response
+            continue
+        try:
+            page = GoodreadsBookPage.from_html(url, response.text)
+        except GoodreadsParseError as e:
+            # Partially rendered page, drop it from the cache and refetch under the retry policy.
+            _response_cache.discard(url)
+            retry_state = retry_policy.new_request(url)
+            if not retry_state.should_retry(RetryPolicy.PARSE_FAILURE):
+                yield url, e
+                continue
+            try:
+                page = load_goodreads_book_page(url, retry_state)
+            except Exception as e:
+                yield url, e
+                continue
+        _memoize_book_page(url, page)
+        yield url, page
 
-        pub_element = soup.find('p', {'data-testid': 'publicationInfo'})
-        pub_text = pub_element.text.strip() if pub_element else None
-        return description_element.text, pub_text
+def load_goodreads_book_from_url(url):
+    return load_goodreads_book_page(url)
+
+def find_book_on_goodreads(book):
+    # Use the search_result_for_book to get the best match
+    best_match = search_result_for_book(book)
+    if best_match:
+        return load_goodreads_book_from_url(best_match)
+    else:
+        return None
+
+def series_link_from_book(book):
+    url = book.goodreads_link
+    series_link = load_goodreads_book_page(url).series_link
+    if series_link:
+        return series_link
+
+    # Only asked for books in a series, so the page was probably partially rendered: drop it
+    # and refetch under the retry policy until the link shows up.
+    def parse(response):
+        page = GoodreadsBookPage.from_html(url, response.text)
+        if not page.series_link:
+            raise GoodreadsParseError("Series link element not found")
+        return page
 
-    return retry_with_backoff(fetch_data, max_retries, backoff_factor)
+    retry_state = retry_policy.new_request(url)
+    if not retry_state.should_retry(RetryPolicy.PARSE_FAILURE):
+        raise GoodreadsParseError("Series link element not found")
+    _response_cache.discard(url)
+    page = fetch_parsed(url, parse, retry_state)
+    _memoize_book_page(url, page)
+    return page.series_link
 
-def book_urls_from_series_url(series_url, max_retries=3, backoff_factor=0.5):
-    def fetch_data():
-        response = requests_get_with_retry(series_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+def book_urls_from_series_url(series_url):
+    def parse(response):
+        soup = parsed_html(response, parse_only=SERIES_PAGE_STRAINER)
+
+        book_elements = soup.find_all('div', {'class': 'listWithDividers__item'})
+        if not book_elements:
+            raise GoodreadsParseError("Series list elements not found")
 
         book_urls = []
-        for book_element in soup.find_all('div', {'class': 'listWithDividers__item'}):
+        for book_element in book_elements:
             found_any_book_match = False
             for h3_element in book_element.find_all('h3'):
                 if h3_element.text.strip().startswith('Book '):
@@ -213,41 +668,60 @@ def book_urls_from_series_url(series_url, max_retries=3, backoff_factor=0.5):
                 continue
 
             book_link = book_element.find('a', itemprop='url')
+            if not book_link or 'href' not in book_link.attrs:
+                raise GoodreadsParseError("Series book link element not found")
             book_urls.append(f"https://www.goodreads.com/{book_link['href']}")
         return book_urls
 
-    return retry_with_backoff(fetch_data, max_retries, backoff_factor)
+    book_urls = _parsed_page_flights.do(('series', _normalized_url(series_url)), lambda: fetch_parsed(series_url, parse))
+    return list(book_urls)
+
+def search_result_for_book(book):
+    """Url of the best Goodreads search match for `book`, or None. Resolutions (and misses) are cached by query."""
+    cache_key = f"{stripped(book.title)}+{stripped(book.author)}"
+    best_match = _search_cache.get(cache_key)
+    if best_match is not _NOT_CACHED:
+        logging.debug(f"Serving search for {book.title} ({book.author}) from the search cache: {best_match}.")
+        return best_match
+    best_match = _search_goodreads_for_book(book)
+    _search_cache.put(cache_key, best_match)
+    return best_match
 
-def search_result_for_book(book, max_retries=3, backoff_factor=0.5):
-    book_authors = [a.strip() for a in book.author.split('&')]
+def _search_goodreads_for_book(book):
     search_queries = [f"{stripped(book.title)}+{stripped(book.author)}", stripped(book.title)]
+    # Both queries share one retry budget, they're a single lookup.
+    retry_state = retry_policy.new_request(f"search for {book.title} ({book.author})")
     for search_query in search_queries:
-        def fetch_data():
-            response = requests_get_with_retry(f"https://www.goodreads.com/search?q={search_query}")
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
+        def parse(response):
+            soup = parsed_html(response, parse_only=SEARCH_PAGE_STRAINER)
 
             max_score = 0
             best_match = None
             for tr in soup.find_all('tr', {'itemtype': 'http://schema.org/Book'}):
                 title_link = tr.find('a', title=True)
+                if not title_link:
+                    raise GoodreadsParseError("Search result title element not found")
                 title_text = title_link.get('title')
                 title_text = re.sub(r'\s+', ' ', title_text).strip()
 
                 book_item_authors = []
                 for a_element in tr.find_all('a', class_='authorName'):
-                    author = a_element.find('span', itemprop='name').text 
+                    author_name_element = a_element.find('span', itemprop='name')
+                    if not author_name_element:
+                        raise GoodreadsParseError("Search result author element not found")
+                    author = author_name_element.text
                     author = re.sub(r'\s+', ' ', author).strip()
                     book_item_authors.append(author)
 
                 max_author_ratio = 0
                 for item_author in book_item_authors:
-                    for book_author in book_authors:
-                        author_ratio = fuzz.partial_ratio(stripped(book_author), stripped(item_author))
+                    stripped_item_author = stripped(item_author)
+                    for book_author in book.normalized_author_names:
+                        author_ratio = fuzz.partial_ratio(book_author, stripped_item_author)
                         if author_ratio > max_author_ratio:
                             max_author_ratio = author_ratio
 
-                title_ratio = fuzz.partial_ratio(stripped_title(book.title), stripped_title(title_text))
+                title_ratio = fuzz.partial_ratio(book.normalized_title, stripped_title(title_text))
 
                 # pp.pp(title_text)
                 # pp.pp(book_item_authors)
@@ -261,81 +735,481 @@ def search_result_for_book(book, max_retries=3, backoff_factor=0.5):
                 if max_author_ratio >= 90 and combined_score > max_score:
                     max_score = combined_score
                     best_match = f"https://www.goodreads.com{title_link.get('href')}"
-            if best_match:
-                return best_match
-
-        return retry_with_backoff(fetch_data, max_retries, backoff_factor)
-
-def requests_get_with_retry(url, max_retries=10, backoff_factor=0.5, headers=None):
-    """Send a GET request with a session and retry on errors with exponential backoff, with browser-like headers."""
-    # Reuse a process-wide session so a solved WAF token (cookie) is shared across requests.
-    session = _get_session()
-    # Set default headers to mimic a browser if none are provided. The User-Agent must match
-    # the one used to solve the WAF challenge, since the token cookie is bound to it.
-    if headers is None:
-        headers = {
-            'User-Agent': _USER_AGENT,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'DNT': '1',  # Do Not Track Request Header
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
-    session.headers.update(headers)
-    retries = 0
-    waf_solve_attempts = 0
-    while True:
+            return best_match
+
+        best_match = fetch_parsed(f"https://www.goodreads.com/search?q={search_query}", parse, retry_state)
+        if best_match:
+            return best_match
+    return None
+
+def parsed_html(response, parse_only=None):
+    """
+    BeautifulSoup document for `response`. A full parse is done at most once per response;
+    pass `parse_only` to build just the parts a scraper reads when there's no full parse yet.
+    """
+    soup = getattr(response, '_parsed_html', None)
+    if soup is not None:
+        return soup
+    if parse_only is not None:
+        return parse_html(response.text, parse_only=parse_only)
+    soup = parse_html(response.text)
+    response._parsed_html = soup
+    return soup
+
+# Hosts that serve a `div#canonical-url-updater` client-side redirect.
+_CANONICAL_URL_HOSTS = ('reddit.com',)
+_CANONICAL_URL_DIV_RE = re.compile(r'<div\b[^>]*\bid=["\']canonical-url-updater["\'][^>]*>', re.IGNORECASE)
+_VALUE_ATTR_RE = re.compile(r'\bvalue=(?:"([^"]*)"|\'([^\']*)\')', re.IGNORECASE)
+
+def _canonical_url_from_response(url, response):
+    """
+    The `div#canonical-url-updater` redirect target in `response`, if any.
+
+    Only checked for hosts that use it, and found with a regex over the raw HTML instead of
+    building a full document. If the div is there but the regex can't read it, fall back to
+    parsing, and keep that parse on the response for the caller.
+    """
+    host = urlparse(url).hostname or ""
+    if not any(host == h or host.endswith(f".{h}") for h in _CANONICAL_URL_HOSTS):
+        return None
+
+    text = response.text
+    if 'canonical-url-updater' not in text:
+        return None
+
+    div_match = _CANONICAL_URL_DIV_RE.search(text)
+    value_match = _VALUE_ATTR_RE.search(div_match.group()) if div_match else None
+    if value_match:
+        return html.unescape(value_match.group(1) if value_match.group(1) is not None else value_match.group(2))
+
+    canonical_url_div = parsed_html(response).find("div", id="canonical-url-updater")
+    if not canonical_url_div or 'value' not in canonical_url_div.attrs:
+        return None
+    return canonical_url_div['value']
+
+def _is_rate_limited_host(url):
+    host = urlparse(url).hostname or ""
+    return any(host == h or host.endswith(f".{h}") for h in _RATE_LIMITED_HOSTS)
+
+
+class RateGovernor:
+    """
+    Token bucket shared by every Goodreads request in the process, with an AIMD-adjusted rate.
+
+    `acquire()` must be awaited on the fetcher's loop before each request; report how it went
+    with `on_success()` / `on_throttled()`. The rate is persisted to `state_file` by `save()`,
+    only if a request reported back, so a process that sent none can't clobber another's rate.
+    """
+    def __init__(self, state_file=_RATE_STATE_FILE):
+        self.state_file = state_file
+        self.rate = self._load_rate()
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._dirty = False
+
+    def _load_rate(self):
         try:
-            response = session.get(url, allow_redirects=True, headers=headers, timeout=30)
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-            # Goodreads intermittently resets/drops connections (e.g. when rate-limiting). Treat a
-            # dropped connection like a 5xx and retry with backoff instead of crashing the whole run.
-            if retries >= max_retries:
-                raise
-            retries += 1
-            logging.warning(f"Network error fetching {url} ({e}); retry {retries}/{max_retries}..")
-            time.sleep(backoff_factor * (2 ** (retries - 1)))
-            continue
-        if _is_waf_challenge(response):
-            if waf_solve_attempts >= 2:
-                raise RuntimeError(f"Unable to clear Goodreads WAF challenge for {url}")
-            waf_solve_attempts += 1
-            _apply_cookies(session, _solve_waf_challenge(url))
-            continue
-        if response.status_code // 100 == 2:
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # This is used so https://www.reddit.com/r/litrpg/comments/1l1mosi/ gets
-            # redirected to https://www.reddit.com/r/litrpg/comments/1l1mosi/june_2025_releases_promotions/
-            canonical_url_div = soup.find("div", id="canonical-url-updater")
-            if not canonical_url_div:
-                return response
+            with open(self.state_file) as f:
+                rate = float(json.load(f)['requests_per_second'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return _INITIAL_REQUESTS_PER_SECOND
+        return min(max(rate, _MIN_REQUESTS_PER_SECOND), _MAX_REQUESTS_PER_SECOND)
 
-            if 'value' not in canonical_url_div.attrs:
-                return response
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            with open(self.state_file, 'w') as f:
+                json.dump({'requests_per_second': self.rate, 'updated_at': time.time()}, f)
+        except OSError:
+            pass
 
-            if url == canonical_url_div['value']:
-                return response
+    def _refill(self):
+        now = time.monotonic()
+        # Allow a burst of up to one second's worth of requests.
+        self._tokens = min(max(self.rate, 1.0), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self):
+        self._dirty = True
+        self.rate = min(_MAX_REQUESTS_PER_SECOND, self.rate + _RATE_INCREASE_PER_SUCCESS)
+
+    def on_throttled(self):
+        self._dirty = True
+        now = time.monotonic()
+        if now - self._last_decrease < _RATE_DECREASE_COOLDOWN_SECONDS:
+            return
+        self._last_decrease = now
+        self.rate = max(_MIN_REQUESTS_PER_SECOND, self.rate * _RATE_DECREASE_FACTOR)
+        logging.info(f"Goodreads is pushing back; slowing down to {self.rate:.2f} requests/s.")
+
+
+class RetryPolicy:
+    """
+    The one place that decides whether a failed Goodreads request is worth another try.
+
+    Failures are classified (see the kind constants below) and each kind has its own retry
+    cap. On top of that, one logical request (a fetch plus parsing its page) gets at most
+    `max_retries_per_request` retries and the whole run at most `run_budget`, so a dead page
+    or a Goodreads outage fails fast instead of stalling workers for minutes. WAF challenge
+    retries don't count against (or stop at) the run budget: they wait on the one coordinated
+    solve, and a token expiring late in a long run would otherwise fail every request left.
+    Call `new_request()` to get the RetryState that tracks a single request.
+    """
+    NETWORK = 'network'
+    SERVER_ERROR = 'server_error'
+    WAF_CHALLENGE = 'waf_challenge'
+    PARSE_FAILURE = 'parse_failure'
+    NOT_FOUND = 'not_found'
+    OTHER = 'other'
+
+    DEFAULT_MAX_RETRIES_BY_KIND = {
+        NETWORK: 4,
+        SERVER_ERROR: 4,
+        WAF_CHALLENGE: 2,
+        PARSE_FAILURE: 2,
+        NOT_FOUND: 0,
+        OTHER: 0,
+    }
+    # Kinds only capped per request, not by the run budget.
+    RUN_BUDGET_EXEMPT_KINDS = frozenset({WAF_CHALLENGE})
+
+    def __init__(self, max_retries_by_kind=None, max_retries_per_request=6, run_budget=500, backoff_factor=0.5, max_backoff=16):
+        self.max_retries_by_kind = dict(self.DEFAULT_MAX_RETRIES_BY_KIND, **(max_retries_by_kind or {}))
+        self.max_retries_per_request = max_retries_per_request
+        self.run_budget = run_budget
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retries_by_kind = defaultdict(int)
+        self._lock = threading.Lock()
+        self._warned_budget_exhausted = False
+
+    def new_request(self, description):
+        return RetryState(self, description)
+
+    @classmethod
+    def classify(cls, error):
+        if isinstance(error, GoodreadsParseError):
+            return cls.PARSE_FAILURE
+        if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+            if error.response.status_code == 404:
+                return cls.NOT_FOUND
+            if error.response.status_code // 100 == 5:
+                return cls.SERVER_ERROR
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, aiohttp.ClientError, asyncio.TimeoutError)):
+            return cls.NETWORK
+        return cls.OTHER
+
+    @property
+    def retries_spent(self):
+        return sum(self.retries_by_kind.values())
+
+    @property
+    def budgeted_retries_spent(self):
+        return sum(count for kind, count in self.retries_by_kind.items() if kind not in self.RUN_BUDGET_EXEMPT_KINDS)
+
+    def _allow(self, retry_state, kind):
+        if retry_state.retries_by_kind[kind] >= self.max_retries_by_kind.get(kind, 0):
+            return False
+        if retry_state.retries >= self.max_retries_per_request:
+            return False
+        with self._lock:
+            if kind not in self.RUN_BUDGET_EXEMPT_KINDS and self.budgeted_retries_spent >= self.run_budget:
+                if not self._warned_budget_exhausted:
+                    self._warned_budget_exhausted = True
+                    logging.warning(f"Spent the run's retry budget ({self.run_budget}); failing requests without retrying from now on.")
+                return False
+            self.retries_by_kind[kind] += 1
+        retry_state.retries_by_kind[kind] += 1
+        return True
+
+    def report(self):
+        by_kind = ", ".join(f"{kind}: {count}" for kind, count in sorted(self.retries_by_kind.items()))
+        return f"Spent {self.budgeted_retries_spent}/{self.run_budget} budgeted retries this run ({by_kind or 'none'})."
+
+
+class RetryState:
+    """Retries spent so far on one logical request."""
+    def __init__(self, policy, description):
+        self.policy = policy
+        self.description = description
+        self.retries_by_kind = defaultdict(int)
+
+    @property
+    def retries(self):
+        return sum(self.retries_by_kind.values())
 
-            print(f"Redirected from {url} to {canonical_url_div['value']}")
-            url = canonical_url_div['value']
-        elif retries >= max_retries:
-            response.raise_for_status()
-            return response
-        elif response.status_code // 100 == 5:
-            retries += 1
-            time.sleep(backoff_factor * (2 ** (retries - 1)))
+    def should_retry(self, kind):
+        """True (and counts the retry) if `kind` of failure may be retried once more."""
+        return self.policy._allow(self, kind)
+
+    def backoff(self):
+        """Seconds to wait before the next retry."""
+        return min(self.policy.max_backoff, self.policy.backoff_factor * (2 ** max(self.retries - 1, 0)))
+
+
+retry_policy = RetryPolicy()
+
+
+def _to_requests_response(url, status, reason, headers, body, encoding):
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason
+    response.url = url
+    response.headers = requests.structures.CaseInsensitiveDict(headers)
+    response.encoding = encoding
+    response._content = body
+    return response
+
+
+class AsyncFetcher:
+    """
+    Event loop-driven HTTP client shared by every fetch in the process.
+
+    The loop runs on a daemon thread, so sync code (including worker threads) submits requests
+    with `run()` / `fetch_all()` while coroutines await `get()` directly. All requests share one
+    aiohttp connection pool with keep-alive and a per-host connection limit.
+
+    When Goodreads answers with a WAF challenge, a single headless-browser solve is started and
+    every request to Goodreads parks until it finishes (instead of failing or launching a
+    browser of its own), then retries with the new token.
+    """
+    def __init__(self, max_connections=_MAX_CONNECTIONS, max_connections_per_host=_MAX_CONNECTIONS_PER_HOST):
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self._loop = None
+        self._start_lock = threading.Lock()
+        self._client = None
+        self.governor = RateGovernor()
+        self._waf_solve = None
+        # Bumped after each successful solve, so a request that was sent with an old token can
+        # tell its challenge has already been dealt with.
+        self._waf_generation = 0
+        # Requests in flight by (normalized url, use_cache, headers), only touched on the loop.
+        self._in_flight = {}
+        self.deduplicated = 0
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="goodreads-fetcher", daemon=True).start()
+        return self._loop
+
+    def submit(self, coro):
+        """Schedule `coro` on the fetcher's loop, returning a concurrent.futures.Future."""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def run(self, coro):
+        """Run `coro` on the fetcher's loop and block until it finishes (for sync callers)."""
+        loop = self._ensure_loop()
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is loop:
+            raise RuntimeError("AsyncFetcher.run() called from the fetcher's own loop, await the coroutine instead!")
+        return self.submit(coro).result()
+
+    def fetch_all(self, urls, concurrency=None, **kwargs):
+        """
+        Fetch `urls` concurrently (at most `concurrency` in flight), yielding (url, response)
+        as each completes, or (url, exception) if it failed.
+        """
+        limit = asyncio.Semaphore(concurrency) if concurrency else None
+
+        async def fetch_one(url):
+            if limit is None:
+                return await self.get(url, **kwargs)
+            async with limit:
+                return await self.get(url, **kwargs)
+
+        futures = {self.submit(fetch_one(url)): url for url in urls}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+
+    def close(self):
+        """Close the connection pool and save the learned request rate, if any (registered to run at exit)."""
+        self.governor.save()
+        if retry_policy.retries_spent:
+            logging.info(retry_policy.report())
+        if self.deduplicated or _parsed_page_flights.shared:
+            logging.info(f"Shared {self.deduplicated} duplicate requests and {_parsed_page_flights.shared} duplicate page parses with in-flight ones.")
+        if self._loop is None or self._client is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result(timeout=5)
+        self._client = None
+
+    def _session(self):
+        if self._client is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_connections_per_host)
+            self._client = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=_REQUEST_TIMEOUT_SECONDS),
+                headers=_DEFAULT_HEADERS,
+            )
+            _apply_cookies(self._client.cookie_jar, _load_waf_cookies())
+        return self._client
+
+    async def _solve_waf(self, url, generation):
+        """Solve the WAF challenge seen by a request sent at `generation`, or wait for the solve in progress."""
+        if self._waf_solve is None:
+            if generation != self._waf_generation:
+                return
+            self._waf_solve = asyncio.ensure_future(self._run_waf_solve(url))
+        await asyncio.shield(self._waf_solve)
+
+    async def _run_waf_solve(self, url):
+        try:
+            # The Playwright sync API can't run on an event loop thread.
+            cookies = await asyncio.get_running_loop().run_in_executor(None, _solve_waf_challenge, url)
+            _apply_cookies(self._session().cookie_jar, cookies)
+            self._waf_generation += 1
+        finally:
+            self._waf_solve = None
+
+    async def _send(self, url, headers):
+        # Park behind an in-flight WAF solve rather than sending a request that will be challenged.
+        if self._waf_solve is not None:
+            try:
+                await asyncio.shield(self._waf_solve)
+            except Exception:
+                pass
+        if _is_rate_limited_host(url):
+            await self.governor.acquire()
+        generation = self._waf_generation
+        async with self._session().get(url, headers=headers, allow_redirects=True) as resp:
+            body = await resp.read()
+            response = _to_requests_response(str(resp.url), resp.status, resp.reason, resp.headers, body, resp.charset)
+        return response, generation
+
+    async def get(self, url, headers=None, use_cache=True, retry_state=None):
+        """
+        Async equivalent of `requests_get_with_retry`. Concurrent gets of the same url share one
+        request and response (retried under the first caller's retry state).
+        """
+        key = (_normalized_url(url), use_cache, tuple(sorted((headers or {}).items())))
+        in_flight = self._in_flight.get(key)
+        if in_flight is None:
+            in_flight = asyncio.ensure_future(self._get(url, headers, use_cache, retry_state))
+            self._in_flight[key] = in_flight
+            in_flight.add_done_callback(lambda _: self._in_flight.pop(key, None))
         else:
-            response.raise_for_status()
+            self.deduplicated += 1
+            logging.debug(f"Joining in-flight request for {url}.")
+        # Shielded so one caller giving up doesn't cancel the request for the others.
+        return await asyncio.shield(in_flight)
+
+    async def _get(self, url, headers, use_cache, retry_state):
+        cache_ttl = _cache_ttl_for_url(_normalized_url(url)) if use_cache else None
+        cached = await asyncio.to_thread(_response_cache.get, url) if cache_ttl else None
+        if cached and cached.is_fresh(cache_ttl):
+            logging.debug(f"Serving {url} from the response cache.")
+            return cached.to_response()
+
+        # The User-Agent must match the one used to solve the WAF challenge, since the token
+        # cookie is bound to it.
+        request_headers = dict(headers or {})
+        if cached:
+            request_headers.update(cached.conditional_headers())
+        retry_state = retry_state or retry_policy.new_request(url)
+        while True:
+            rate_limited = _is_rate_limited_host(url)
+            try:
+                response, generation = await self._send(url, request_headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Goodreads intermittently resets/drops connections (e.g. when rate-limiting). Treat a
+                # dropped connection like a 5xx and retry with backoff instead of crashing the whole run.
+                if rate_limited:
+                    self.governor.on_throttled()
+                if not retry_state.should_retry(RetryPolicy.NETWORK):
+                    raise requests.exceptions.ConnectionError(f"Failed to fetch {url}: {e}") from e
+                logging.warning(f"Network error fetching {url} ({e}); retry {retry_state.retries}..")
+                await asyncio.sleep(retry_state.backoff())
+                continue
+            if rate_limited:
+                if _is_waf_challenge(response) or response.status_code // 100 == 5:
+                    self.governor.on_throttled()
+                elif response.status_code // 100 in (2, 3):
+                    self.governor.on_success()
+            if _is_waf_challenge(response):
+                # A request sent before the latest solve just needs to go again with the new token.
+                if generation == self._waf_generation and not retry_state.should_retry(RetryPolicy.WAF_CHALLENGE):
+                    raise RuntimeError(f"Unable to clear Goodreads WAF challenge for {url}")
+                await self._solve_waf(url, generation)
+                continue
+            if response.status_code == 304 and cached:
+                await asyncio.to_thread(_response_cache.mark_revalidated, url)
+                return cached.to_response()
+            if response.status_code // 100 == 2:
+                response.raise_for_status()
+                if cache_ttl:
+                    await asyncio.to_thread(_response_cache.put, url, response)
+
+                # This is used so https://www.reddit.com/r/litrpg/comments/1l1mosi/ gets
+                # redirected to https://www.reddit.com/r/litrpg/comments/1l1mosi/june_2025_releases_promotions/
+                canonical_url = _canonical_url_from_response(url, response)
+                if not canonical_url:
+                    return response
+
+                if url == canonical_url:
+                    return response
+
+                print(f"Redirected from {url} to {canonical_url}")
+                url = canonical_url
+            elif response.status_code // 100 == 5 and retry_state.should_retry(RetryPolicy.SERVER_ERROR):
+                await asyncio.sleep(retry_state.backoff())
+            else:
+                # 404s and other 4xx are never worth retrying.
+                response.raise_for_status()
+                return response
 
-def retry_with_backoff(fetch_data_fn, max_retries=3, backoff_factor=0.5):
-    retries = 0
-    while retries < max_retries:
+
+_fetcher = AsyncFetcher()
+atexit.register(_fetcher.close)
+
+
+def requests_get_with_retry(url, headers=None, use_cache=True, retry_state=None):
+    """Send a GET request with a session and retry on errors with exponential backoff, with browser-like headers.
+
+    Runs on the shared AsyncFetcher, so concurrent callers share its connection pool and WAF token.
+    Retries follow `retry_policy`; pass a RetryState to share one budget across related requests.
+    Goodreads book / series / search pages are served from the on-disk response cache while
+    fresh, and revalidated against Goodreads once stale. Pass use_cache=False to always fetch.
+    """
+    return _fetcher.run(_fetcher.get(url, headers, use_cache, retry_state))
+
+def fetch_parsed(url, parse, retry_state=None):
+    """
+    Fetch `url` and return `parse(response)`.
+
+    Network errors, 5xx and WAF challenges are already retried by the fetcher. A page that
+    fails to parse is dropped from the response cache and fetched again while the retry
+    policy allows it.
+    """
+    retry_state = retry_state or retry_policy.new_request(url)
+    while True:
+        response = requests_get_with_retry(url, retry_state=retry_state)
         try:
-            return fetch_data_fn()
+            return parse(response)
         except Exception as e:
-            retries += 1
-            if retries >= max_retries:
-                raise e
-            time.sleep(backoff_factor * (2 ** (retries - 1)))
+            if retry_policy.classify(e) != RetryPolicy.PARSE_FAILURE:
+                raise
+            _response_cache.discard(url)
+            if not retry_state.should_retry(RetryPolicy.PARSE_FAILURE):
+                raise
+            logging.warning(f"Failed to parse {url} ({e}); retry {retry_state.retries}..")
+            time.sleep(retry_state.backoff())
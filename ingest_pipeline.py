@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from functools import partial
+from batch_writer import BatchWriter
+from book import authors_match
+from book_refresh_metadata import BookRefreshMetadata
+from books_from_reddit import find_books_from_table_in_reddit_releases_post
+from reddit_row_store import RedditRowStore, row_key
+from reddit_thread_store import RedditThreadStore, rows_hash
+
+# These authors have partially translated series that make the script think
+# the series are missing books, just ignore them for now.
+BANNED_AUTHORS = {"Vasily Mahanenko", "Pavel Kornev"}
+
+DEFAULT_THREAD_WORKERS = 4
+DEFAULT_GOODREADS_WORKERS = 6
+
+class StageStats:
+    """ Items in / out and time spent by one pipeline stage, for the throughput report. """
+    def __init__(self, name):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_seconds = 0.0
+        self._first_started = None
+        self._last_finished = None
+
+    def record(self, started, finished=None, items_in=1, items_out=1):
+        finished = finished or time.monotonic()
+        self.items_in += items_in
+        self.items_out += items_out
+        self.busy_seconds += finished - started
+        self._first_started = started if self._first_started is None else min(self._first_started, started)
+        self._last_finished = finished if self._last_finished is None else max(self._last_finished, finished)
+
+    def summary(self):
+        wall_seconds = (self._last_finished - self._first_started) if self._first_started is not None else 0.0
+        rate = self.items_in / wall_seconds if wall_seconds > 0 else 0.0
+        return (f"{self.name}: {self.items_in} in, {self.items_out} out in {wall_seconds:.1f}s "
+                f"({rate:.2f}/s, {self.busy_seconds:.1f}s busy)")
+
+class IngestPipeline:
+    """
+    Ingests books from Reddit release threads (or given directly) into the DB in stages:
+
+      threads  - release threads are fetched and parsed concurrently, skipping old ones
+                 already ingested (see RedditThreadStore.due)
+      dedup    - threads whose rows are unchanged since they were last ingested are
+                 dropped (unless among the newest), then rows already known (see `_known_rows`), banned or seen
+                 before in the run (by `row_key`, so same-titled books by other authors stay)
+      resolve  - new rows are looked up on Goodreads, with bounded concurrency
+      series   - series of resolved books that are due a refresh are expanded (same pool)
+      write    - one writer on the calling thread adds books and refresh times to the DB
+
+    Only the network work runs on worker threads. The repository, refresh metadata and
+    BatchWriter are only touched by the calling thread, so the writes are the same as
+    resolving the books one at a time (just in completion order). A thread's fingerprint is
+    written once every row it contains is resolved, including rows it shares with another
+    thread, and not if any failed, so it's retried.
+    """
+    def __init__(self, repo, thread_workers=DEFAULT_THREAD_WORKERS, goodreads_workers=DEFAULT_GOODREADS_WORKERS):
+        self.repo = repo
+        self.thread_workers = thread_workers
+        self.goodreads_workers = goodreads_workers
+        self.threads = RedditThreadStore(repo.db_name)
+        self.rows = RedditRowStore(repo.db_name)
+
+    def run(self, thread_urls=(), books=(), refetch_threads=False):
+        """
+        Ingest the books in the release threads at `thread_urls` (all of them if
+        `refetch_threads`, else those due), and `books` (not checked against known titles).
+        """
+        self.stats = {name: StageStats(name) for name in ('threads', 'dedup', 'resolve', 'series', 'write')}
+        self._meta = BookRefreshMetadata.load_from_db()
+        # row key -> threads waiting on the row being resolved (one entry per copy of the row).
+        self._rows_in_flight = {}
+        # row key -> whether resolving the row failed (transiently), for rows already done.
+        self._row_failed = {}
+        self._series_in_progress = set()
+        self._pending = {}
+        self._fingerprints = self.threads.fingerprints(thread_urls)
+        self._newest_urls = self.threads.newest(thread_urls)
+        # url -> [(rows hash, row count), fetched_at, new rows left to resolve, whether any failed]
+        self._threads_in_progress = {}
+        due_urls = list(thread_urls) if refetch_threads else self.threads.due(thread_urls)
+        if len(due_urls) < len(thread_urls):
+            logging.info(f"Skipping {len(thread_urls) - len(due_urls)} release threads ingested before, fetching {len(due_urls)}.")
+        with ThreadPoolExecutor(self.thread_workers, thread_name_prefix="ingest-threads") as self._thread_pool, \
+                ThreadPoolExecutor(self.goodreads_workers, thread_name_prefix="ingest-goodreads") as self._goodreads_pool, \
+                BatchWriter() as self._writer:
+            for url in due_urls:
+                self._submit(self._thread_pool, self._fetch_thread, url, self._on_fetch_thread)
+            self._dedup(books, check_known=False)
+
+            while self._pending:
+                done, _ = wait(self._pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle = self._pending.pop(future)
+                    handle(*future.result())
+
+        for stats in self.stats.values():
+            logging.info(f"  {stats.summary()}")
+
+    def _submit(self, pool, fn, item, on_done):
+        """ Run `fn(item)` on `pool`, then `on_done(item, (started, finished), result, error)` on the calling thread. """
+        def timed():
+            started = time.monotonic()
+            try:
+                result, error = fn(item), None
+            except Exception as e:
+                result, error = None, e
+            return item, (started, time.monotonic()), result, error
+        self._pending[pool.submit(timed)] = on_done
+
+    # Worker threads: network and parsing only.
+
+    def _fetch_thread(self, url):
+        fetched_at = datetime.now(timezone.utc)
+        return find_books_from_table_in_reddit_releases_post(url), fetched_at
+
+    def _resolve(self, book):
+        book.populate_from_goodreads()
+        return book
+
+    def _expand_series(self, book):
+        return book.find_books_from_series(known_ids=self.repo.ids_with_series)
+
+    # Calling thread: dedup and writes.
+
+    def _on_fetch_thread(self, url, timing, fetched, error):
+        if error is not None:
+            logging.error(f"Failed to load reddit releases url {url}: {error}; skipping thread.")
+            self.stats['threads'].record(*timing, items_out=0)
+            return
+        books, fetched_at = fetched
+        logging.info(f"Found {len(books)} books in reddit releases url: {url}!")
+        self.stats['threads'].record(*timing, items_out=len(books))
+
+        # Hashed now, resolving the rows updates the Book objects.
+        new_hash = rows_hash(books)
+        previous = self._fingerprints.get(url)
+        # The newest threads are matched even if unchanged, so rows that weren't on Goodreads
+        # yet are looked up again (rows resolved before are skipped through the row store).
+        if previous is not None and previous[0] == new_hash and url not in self._newest_urls:
+            started = time.monotonic()
+            logging.info(f"Reddit releases url unchanged since last ingested, skipping its books: {url}")
+            self.threads.put(url, new_hash, len(books), previous, fetched_at, self._writer)
+            self.stats['dedup'].record(started, items_in=len(books), items_out=0)
+            return
+        self._threads_in_progress[url] = [(new_hash, len(books)), fetched_at, 0, False]
+        self._dedup(books, check_known=True, thread_url=url)
+
+    def _known_rows(self, books):
+        """
+        ids (id()) of the `books` (Reddit rows) already in the DB. Rows resolved before are
+        looked up by their key, then rows with the exact title of a book by a matching author,
+        and only the rest are fuzzy matched against every book (built on first use). Rows
+        matched here are recorded so next time they're found by key.
+        """
+        keys = {id(book): row_key(book) for book in books}
+        resolved_ids = self.rows.book_ids(set(keys.values()))
+        books_by_id = self.repo.by_ids(set(resolved_ids.values()))
+        known = {id(book) for book in books if resolved_ids.get(keys[id(book)]) in books_by_id}
+
+        unresolved = [book for book in books if id(book) not in known]
+        books_with_titles = self.repo.with_titles({book.title for book in unresolved})
+        for book in unresolved:
+            match = next((b for b in books_with_titles.get(book.title, ())
+                          if authors_match(book.normalized_author_tokens, b.normalized_author_tokens)), None)
+            if match is None and book.author not in BANNED_AUTHORS:
+                match = self.repo.books_by_title.get_book_matching(book)
+            if match is not None:
+                known.add(id(book))
+                self.rows.put(keys[id(book)], match.id, self._writer)
+        return known
+
+    def _dedup(self, books, check_known, thread_url=None):
+        started = time.monotonic()
+        known = self._known_rows(books) if check_known else set()
+        new_books = []
+        waiting = 0
+        any_failed = False
+        for book in books:
+            if book.author in BANNED_AUTHORS or id(book) in known:
+                continue
+            # Keyed now, resolving the row updates its title and author.
+            key = row_key(book)
+            if key in self._row_failed:
+                # Seen earlier in the run, and its outcome stands for this copy too.
+                any_failed = any_failed or self._row_failed[key]
+                continue
+            if key in self._rows_in_flight:
+                # Resolved for another copy (maybe in another thread), wait on that.
+                if thread_url is not None:
+                    self._rows_in_flight[key].append(thread_url)
+                    waiting += 1
+                continue
+            logging.debug(f"Found new book: {book.title} ({book.author}).")
+            self._rows_in_flight[key] = [thread_url] if thread_url is not None else []
+            new_books.append((key, book))
+        self.stats['dedup'].record(started, items_in=len(books), items_out=len(new_books))
+        for key, book in new_books:
+            self._submit(self._goodreads_pool, self._resolve, book, partial(self._on_resolve, key))
+        if thread_url is not None:
+            self._threads_in_progress[thread_url][2] = len(new_books) + waiting
+            self._thread_row_done(thread_url, resolved=0, failed=any_failed)
+
+    def _row_done(self, key, failed=False):
+        """ Record the outcome of resolving the row `key`, for every thread waiting on it. """
+        self._row_failed[key] = failed
+        for url in self._rows_in_flight.pop(key):
+            self._thread_row_done(url, failed=failed)
+
+    def _thread_row_done(self, url, resolved=1, failed=False):
+        """ Count `resolved` of the thread's rows as done, and record its fingerprint once they all are. """
+        progress = self._threads_in_progress[url]
+        progress[2] -= resolved
+        progress[3] = progress[3] or failed
+        if progress[2] == 0:
+            (new_hash, row_count), fetched_at, _, any_failed = self._threads_in_progress.pop(url)
+            if not any_failed:
+                self.threads.put(url, new_hash, row_count, self._fingerprints.get(url), fetched_at, self._writer)
+
+    def _on_resolve(self, key, book, timing, _, error):
+        if isinstance(error, ValueError):
+            logging.info(f"Ignoring book not found on goodreads: {book.title} ({book.author}).")
+        elif error is not None:
+            # Don't let one book's transient failure (network drop, parse error) abort a long scan.
+            logging.error(f"Failed to process book {book.title} ({book.author}): {error}; skipping.")
+        self.stats['resolve'].record(*timing, items_out=0 if error else 1)
+        if error is not None:
+            self._row_done(key, failed=not isinstance(error, ValueError))
+            return
+
+        started = time.monotonic()
+        self._meta.handle_book_refreshed(book, self._writer)
+        book_in_db = self.repo.find(book)
+        if book_in_db:
+            logging.debug(f"Book already in DB, found: {book_in_db.title} ({book_in_db.author}) (id: {book_in_db.id}).")
+        else:
+            logging.info(f"Added new book: {book.title}.")
+            self.repo.add(book, self._writer)
+        self.rows.put(key, book.id, self._writer)
+        self.stats['write'].record(started, items_out=0 if book_in_db else 1)
+        self._row_done(key)
+
+        # Check if any new books in series, once per series.
+        if book.series and book.series not in self._series_in_progress and self._meta.should_refresh_series(book.series):
+            logging.info(f"Refreshing series: {book.series}..")
+            self._series_in_progress.add(book.series)
+            self._submit(self._goodreads_pool, self._expand_series, book, self._on_expand_series)
+
+    def _on_expand_series(self, book, timing, found_books_from_series, error):
+        series = book.series
+        if error is not None:
+            logging.error(f"Failed to refresh series {series}: {error}; skipping series.")
+            self.stats['series'].record(*timing, items_out=0)
+            return
+        self.stats['series'].record(*timing, items_out=len(found_books_from_series))
+
+        started = time.monotonic()
+        added = 0
+        for book in found_books_from_series:
+            if self.repo.find(book):
+                continue
+            logging.info(f"Found new book in series ({book.series}): {book.title}!")
+            self.repo.add(book, self._writer)
+            added += 1
+        self._meta.handle_series_refreshed(series, self._writer)
+        self.stats['write'].record(started, items_in=len(found_books_from_series), items_out=added)
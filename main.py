@@ -9,12 +9,17 @@ import pprint as pp
 import logging.config
 import textwrap
 from collections import defaultdict
-from book import Book, BooksBySeries, BooksByTitle, find_book
+from datetime import date
+from batch_writer import BatchWriter
+from book import Book
+from book_repository import BookRepository
 from utils import stripped_title, stripped
 import goodreads
 from book_rating import BookRating, Tier
-from book_refresh_metadata import BookRefreshMetadata
-from books_from_reddit import find_books_from_table_in_reddit_releases_post, follow_reddit_releases_link, find_release_thread_urls_from_wiki
+from book_refresh_metadata import BookRefreshMetadata, MIN_TIME_BEFORE_NEXT_REFRESH
+from candidate_filter import CandidateFilter
+from ingest_pipeline import IngestPipeline, DEFAULT_GOODREADS_WORKERS
+from books_from_reddit import follow_reddit_releases_link, find_release_thread_urls_from_wiki
 
 log_level = 'DEBUG'
 logging.config.dictConfig({
@@ -55,6 +60,8 @@ def main():
     input_parser.add_argument('--follow-reddit-releases', action='store_true', help='Follow Reddit releases links to previous months')
     input_parser.add_argument('--manual', type=str, help='Input "Title, Author" as a string')
     input_parser.add_argument('--manual-goodreads', type=str, help='Input Goodreads URL')
+    input_parser.add_argument('--refetch-threads', action='store_true', help='Fetch every release thread, even old ones unchanged since they were last ingested')
+    input_parser.add_argument('--workers', type=int, default=DEFAULT_GOODREADS_WORKERS, help='Max concurrent Goodreads lookups')
 
     # Subcommand 'refresh-books'
     refresh_books_parser = subparsers.add_parser('refresh-books', help='Refresh books DB')
@@ -73,37 +80,23 @@ def main():
 
     args = parser.parse_args()
 
-    # Load books from the database first
-    books_by_id = {book.id: book for book in Book.load_books_from_db()}
-    books_by_title = BooksByTitle(books_by_id.values())
+    # Books are queried as each command needs them, rather than loading the whole DB up front.
+    repo = BookRepository()
 
-    logging.info(f"Loaded {len(books_by_id)} books from the DB.")
     if args.command == 'input':
         if args.follow_reddit_releases and not args.reddit_releases_url:
             raise ValueError("Shouldn't specify --follow-reddit-releases without --reddit-releases-url!")
 
-        new_books = {}
-
-        def process_releases_post(releases_url):
-            books_from_reddit_releases_post = find_books_from_table_in_reddit_releases_post(releases_url)
-            logging.info(f"Found {len(books_from_reddit_releases_post)} books in reddit releases url: {releases_url}!")
-            for new_book in books_from_reddit_releases_post:
-                if not books_by_title.has_book(new_book):
-                    logging.debug(f"Found new book: {new_book.title} ({new_book.author}).")
-                    new_books[new_book.title] = new_book
-
-            process_new_books(new_books, books_by_id, books_by_title)
-            new_books.clear()
+        pipeline = IngestPipeline(repo, goodreads_workers=args.workers)
 
         if args.reddit_releases_wiki_url:
             release_thread_urls = find_release_thread_urls_from_wiki(args.reddit_releases_wiki_url)
             logging.info(f"Found {len(release_thread_urls)} release threads in wiki: {args.reddit_releases_wiki_url}!")
-            for releases_url in release_thread_urls:
-                process_releases_post(releases_url)
+            pipeline.run(thread_urls=release_thread_urls, refetch_threads=args.refetch_threads)
         elif args.reddit_releases_url:
             current_releases_url = args.reddit_releases_url
             while current_releases_url:
-                process_releases_post(current_releases_url)
+                pipeline.run(thread_urls=[current_releases_url], refetch_threads=args.refetch_threads)
                 if args.follow_reddit_releases:
                     current_releases_url = follow_reddit_releases_link(current_releases_url)
                 else:
@@ -115,168 +108,122 @@ def main():
                 exit(1)
             title, author = title_author[0].strip(), title_author[1].strip()
             manual_book = Book(title=title, author=author)
-            new_books[manual_book.title] = manual_book
             logging.info(f"Processing new book: {title} ({author})..")
-            process_new_books(new_books, books_by_id, books_by_title)
+            pipeline.run(books=[manual_book])
         elif args.manual_goodreads:
             goodreads_url = args.manual_goodreads.strip()
             goodreads_book = goodreads.load_goodreads_book_from_url(goodreads_url)
             manual_book = Book(title=goodreads_book.title, author=goodreads_book.author)
             manual_book._populate_from_goodreads_book(goodreads_book)
-            new_books[manual_book.title] = manual_book
             logging.info(f"Processing new book from Goodreads: {manual_book.title} ({manual_book.author})..")
-            process_new_books(new_books, books_by_id, books_by_title)
+            pipeline.run(books=[manual_book])
         else:
             logging.error("Please provide an input parameter (e.g. --reddit-releases-url).")
             exit(1)
 
-        logging.info(f"Finished processing books from input, DB now contains {len(books_by_id)} books.")
+        logging.info(f"Finished processing books from input, DB now contains {repo.count()} books.")
     elif args.command == 'refresh-books':
-        books_by_series = BooksBySeries.from_books(books_by_id.values())
         book_refresh_metadata = BookRefreshMetadata.load_from_db()
+        # Only series / books due for a refresh are loaded.
+        refresh_cutoff = date.today() - MIN_TIME_BEFORE_NEXT_REFRESH
 
-        # Check if any new books in series.
-        for series, books_in_series in books_by_series.items():
-            if not book_refresh_metadata.should_refresh_series(series):
-                continue
-
-            logging.info(f"Refreshing series: {series}..")
-            found_books_from_series = books_in_series[0].find_books_from_series()
-            for book in found_books_from_series:
-                if find_book(books_by_id, books_by_title, book):
-                    continue
-                logging.info(f"Found new book in series ({series}): {book.title}!")
-                book.sync_with_db()
-                books_by_id[book.id] = book
-                books_by_title.add(book)
-            book_refresh_metadata.handle_series_refreshed(series)
-
-        books_to_iterate = [book for book in books_by_id.values()]
-        for book in books_to_iterate:
-            if book.series:
-                continue
-            
-            if not book_refresh_metadata.should_refresh_title(book.title):
-                continue
-
-            logging.info(f"Refreshing book without series: {book.title}..")
-            if book.refresh_if_part_of_series_now_on_goodreads():
-                logging.info(f"Found new series: {book.series}! Refreshing series..")
-                book.sync_with_db()
-                found_books_from_series = book.find_books_from_series()
+        with BatchWriter() as writer:
+            # Check if any new books in series.
+            for series in repo.series_stale_since(refresh_cutoff):
+                logging.info(f"Refreshing series: {series}..")
+                found_books_from_series = repo.by_series(series)[0].find_books_from_series(known_ids=repo.ids_with_series)
                 for book in found_books_from_series:
-                    if find_book(books_by_id, books_by_title, book):
+                    if repo.find(book):
                         continue
                     logging.info(f"Found new book in series ({series}): {book.title}!")
-                    book.sync_with_db()
-                    books_by_id[book.id] = book
-                    books_by_title.add(book)
-            book_refresh_metadata.handle_title_refreshed(book.title)
+                    repo.add(book, writer)
+                book_refresh_metadata.handle_series_refreshed(series, writer)
+
+            for book in repo.stale_since(refresh_cutoff, without_series=True):
+                logging.info(f"Refreshing book without series: {book.title}..")
+                if book.refresh_if_part_of_series_now_on_goodreads():
+                    logging.info(f"Found new series: {book.series}! Refreshing series..")
+                    book.sync_with_db(writer)
+                    found_books_from_series = book.find_books_from_series(known_ids=repo.ids_with_series)
+                    for book in found_books_from_series:
+                        if repo.find(book):
+                            continue
+                        logging.info(f"Found new book in series ({book.series}): {book.title}!")
+                        repo.add(book, writer)
+                book_refresh_metadata.handle_book_refreshed(book, writer)
     elif args.command == 'refresh-unreleased':
         book_refresh_metadata = BookRefreshMetadata.load_from_db()
         
         # Get all books with no ratings
-        unreleased_books = [book for book in books_by_id.values() if book.number_of_ratings == 0]
+        unreleased_books = repo.unreleased()
         logging.info(f"Found {len(unreleased_books)} unreleased books to refresh.")
         
-        for book in unreleased_books:
-            if not book_refresh_metadata.should_refresh_title(book.title):
-                if args.verbose:
-                    logging.info(f"Skipping {book.title} - too soon to refresh")
-                continue
+        with BatchWriter() as writer:
+            for book in unreleased_books:
+                if not book_refresh_metadata.should_refresh_book(book):
+                    if args.verbose:
+                        logging.info(f"Skipping {book.title} - too soon to refresh")
+                    continue
 
-            logging.info(f"Refreshing unreleased book: {book.title}..")
-            try:
-                # Load fresh data from Goodreads
-                goodreads_book = goodreads.load_goodreads_book_from_url(book.goodreads_link)
-                book._populate_from_goodreads_book(goodreads_book)
-                book.sync_with_db()
-                logging.info(f"Updated book: {book.title} - now has {book.number_of_ratings} ratings")
-            except Exception as e:
-                logging.error(f"Failed to refresh book {book.title}: {str(e)}")
-                continue
+                logging.info(f"Refreshing unreleased book: {book.title}..")
+                try:
+                    # Load fresh data from Goodreads
+                    goodreads_book = goodreads.load_goodreads_book_from_url(book.goodreads_link)
+                    book._populate_from_goodreads_book(goodreads_book)
+                    book.sync_with_db(writer)
+                    logging.info(f"Updated book: {book.title} - now has {book.number_of_ratings} ratings")
+                except Exception as e:
+                    logging.error(f"Failed to refresh book {book.title}: {str(e)}")
+                    continue
             
-            book_refresh_metadata.handle_title_refreshed(book.title)
+                book_refresh_metadata.handle_book_refreshed(book, writer)
             
         logging.info("Finished refreshing unreleased books")
     elif args.command == 'rate-continuous':
         book_ratings = BookRating.load_ratings_from_db()
-        books_by_series = BooksBySeries.from_books(books_by_id.values())
 
         # Filter all books first
+        candidate_filter = CandidateFilter(min_pages=MIN_PAGES_FOR_CONSIDERATION, min_ratings=MIN_RATINGS_FOR_CONSIDERATION)
         filtered_books = []
-        for book in books_by_id.values():
-            if args.author and args.author not in book.author:
-                continue
-
-            if args.series and (not book.series or args.series.lower() not in book.series.lower()):
-                continue
-
-            if args.verbose:
-                print(f"\nEvaluating: {book.title} ({book.author})")
-
-            if book_ratings.has_directly_rated_book(book):
+        series_ratings_by_book_id = {}
+        with BatchWriter() as writer:
+            for evaluation in candidate_filter.evaluate(author=args.author, series=args.series):
+                book = evaluation.book
                 if args.verbose:
-                    print(f"  ❌ Filtered: Book already directly rated")
-                continue
+                    print(f"\nEvaluating: {book.title} ({book.author})")
 
-            # Note that this doesn't mark the book as uninterested twice because it checks if
-            # the book has a direct rating above.
-            if book_ratings.has_rated_book_or_series_as_f_tier_or_uninterested(book):
-                if args.verbose:
-                    print(f"  ❌ Filtered: Book or series rated as F tier or uninterested")
-                book_ratings.mark_book_as_uninterested(book)
-                continue
-
-            if books_by_series.any_books_with_less_than_rating_in_series(book, 4):
-                if args.verbose:
-                    print(f"  ❌ Filtered: Series contains books with rating less than 4")
-                book_ratings.mark_book_as_uninterested(book)
-                continue
-
-            if book_ratings.has_rated_series(book.series):
-                if args.verbose:
-                    print(f"  ❌ Filtered: Series already rated")
-                continue
+                # The verdicts are worked out up front, so check again for a book sharing its
+                # title with one marked earlier in this pass.
+                if book_ratings.has_directly_rated_book(book):
+                    if args.verbose:
+                        print(f"  ❌ Filtered: Book already directly rated")
+                    continue
 
-            book_has_enough_pages = book.pages_reported_by_kindle and book.pages_reported_by_kindle >= MIN_PAGES_FOR_CONSIDERATION
-            series_has_enough_pages = book.series and books_by_series.total_pages_reported_by_kindle_for_series(book.series) >= MIN_PAGES_FOR_CONSIDERATION
-            has_enough_pages = book_has_enough_pages or series_has_enough_pages
-            if not has_enough_pages:
-                if args.verbose:
-                    book_pages = book.pages_reported_by_kindle or "unknown"
-                    series_pages = books_by_series.total_pages_reported_by_kindle_for_series(book.series) if book.series else "N/A"
-                    print(f"  ❌ Filtered: Not enough pages (book: {book_pages}, series: {series_pages}, min: {MIN_PAGES_FOR_CONSIDERATION})")
-                # Revisit when book / series has enough pages..
-                continue
+                if not evaluation.is_candidate:
+                    if args.verbose:
+                        print(f"  ❌ Filtered: {evaluation.explanation()}")
+                    # Books below page / rating minimums are revisited once they have enough.
+                    if evaluation.rejected_by.marks_uninterested:
+                        book_ratings.mark_book_as_uninterested(book, writer)
+                    continue
 
-            book_has_enough_ratings = book.number_of_ratings >= MIN_RATINGS_FOR_CONSIDERATION
-            series_has_enough_ratings = book.series and books_by_series.total_number_of_ratings_for_series(book.series) >= MIN_RATINGS_FOR_CONSIDERATION
-            has_enough_ratings = book_has_enough_ratings or series_has_enough_ratings
-            if not has_enough_ratings:
                 if args.verbose:
-                    book_ratings_count = book.number_of_ratings or 0
-                    series_ratings_count = books_by_series.total_number_of_ratings_for_series(book.series) if book.series else 0
-                    print(f"  ❌ Filtered: Not enough ratings (book: {book_ratings_count}, series: {series_ratings_count}, min: {MIN_RATINGS_FOR_CONSIDERATION})")
-                # Revisit when book / series has enough ratings..
-                continue
-
-            if args.verbose:
-                print(f"  ✅ Included: Passed all filters")
-            filtered_books.append(book)
+                    print(f"  ✅ Included: Passed all filters")
+                filtered_books.append(book)
+                series_ratings_by_book_id[book.id] = evaluation.series_ratings
 
         # Sort filtered books by popularity (number of reviews) - most popular first
         def get_review_count(book):
             if book.series:
                 series_ranking = 999 if book.series_number == "1" else 0
-                return (books_by_series.total_number_of_ratings_for_series(book.series), series_ranking)
+                return (series_ratings_by_book_id[book.id], series_ranking)
             else:
                 return (book.number_of_ratings or 0, 0)
 
         filtered_books.sort(key=get_review_count, reverse=True)
 
         if args.verbose:
-            total_books = len(books_by_id)
+            total_books = repo.count()
             included_books = len(filtered_books)
             filtered_out_books = total_books - included_books
             print(f"\n=== FILTERING SUMMARY ===")
@@ -287,19 +234,23 @@ def main():
 
         # Process books in popularity order
         for book in filtered_books:
-            # It's possible that we just rated the series, so check again.
+            # It's possible that we just rated the series (or a book with the same title), so check again.
             if book_ratings.has_rated_series(book.series):
                 if args.verbose:
                     print(f"Skipping '{book.title}': series is already rated.")
                 continue
+            if book_ratings.has_directly_rated_book(book):
+                if args.verbose:
+                    print(f"Skipping '{book.title}': book is already rated.")
+                continue
 
             # Present the book / series to the user.
             print(f"{book.title} ({book.author})")
             if book.series:
-                series_books = books_by_series.books_by_series[book.series]
+                series_books = repo.by_series(book.series)
                 series_avg_rating = sum(b.average_rating for b in series_books if b.average_rating) / len(series_books)
                 total_series_ratings = sum(b.number_of_ratings for b in series_books if b.number_of_ratings)
-                total_series_pages = books_by_series.total_pages_reported_by_kindle_for_series(book.series)
+                total_series_pages = sum(b.pages_reported_by_kindle or 0 for b in series_books)
                 print(f"\tBook #{book.series_number} of {len(series_books)} in {book.series}")
                 print(f"\t{series_avg_rating:.2f} (total {total_series_ratings} ratings)")
                 print(f"\t{total_series_pages} total pages in series")
@@ -310,7 +261,7 @@ def main():
             print(f"Goodreads link: {book.goodreads_link}")
             print("")
 
-            description = goodreads.description_text_for_book(book)
+            description = goodreads.load_goodreads_book_page(book.goodreads_link).description or ""
             # Find the last complete word that fits in the DESCRIPTION_MAX_CHARACTERS character limit
             last_space = description.rfind(' ', 0, DESCRIPTION_MAX_CHARACTERS)
             if len(description) > DESCRIPTION_MAX_CHARACTERS and last_space != -1:
@@ -349,53 +300,5 @@ def main():
             print("")
             print("")
 
-def process_new_books(new_books, books_by_id, books_by_title):
-    # These authors have partially translated series that make the script think
-    # the series are missing books, just ignore them for now.
-    banned_authors = set(["Vasily Mahanenko", "Pavel Kornev"])
-    new_books = [book for book in new_books.values() if book.author not in banned_authors]
-    
-    book_refresh_metadata = BookRefreshMetadata.load_from_db()
-    for book in new_books:
-        try:
-            book.populate_from_goodreads()
-            book_refresh_metadata.handle_title_refreshed(book.title)
-        except ValueError:
-            logging.info(f"Ignoring book not found on goodreads: {book.title} ({book.author}).")
-            continue
-        except Exception as e:
-            # Don't let one book's transient failure (network drop, parse error) abort a long scan.
-            logging.error(f"Failed to process book {book.title} ({book.author}): {e}; skipping.")
-            continue
-
-        book_in_db = find_book(books_by_id, books_by_title, book)
-        if book_in_db:
-            logging.debug(f"Book already in DB, found: {book_in_db.title} ({book_in_db.author}) (id: {book_in_db.id}).")
-        else:
-            logging.info(f"Added new book: {book.title}.")
-            books_by_id[book.id] = book
-            books_by_title.add(book)
-            book.sync_with_db()
-
-        if book.series:
-            # Check if any new books in series.
-            if not book_refresh_metadata.should_refresh_series(book.series):
-                continue
-
-            logging.info(f"Refreshing series: {book.series}..")
-            try:
-                found_books_from_series = book.find_books_from_series()
-            except Exception as e:
-                logging.error(f"Failed to refresh series {book.series}: {e}; skipping series.")
-                continue
-            for book in found_books_from_series:
-                if find_book(books_by_id, books_by_title, book):
-                    continue
-                logging.info(f"Found new book in series ({book.series}): {book.title}!")
-                book.sync_with_db()
-                books_by_id[book.id] = book
-                books_by_title.add(book)
-            book_refresh_metadata.handle_series_refreshed(book.series)
-
 if __name__ == "__main__":
     main()
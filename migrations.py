@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime, timezone
+from utils import content_hash
+
+# Ratings and refresh metadata used to live in their own files, keyed by title / series.
+LEGACY_RATINGS_DB = "book_ratings.db"
+LEGACY_REFRESH_METADATA_DB = "book_refresh_metadata.db"
+# Descriptions used to be cached in a JSON file next to the scripts.
+LEGACY_DESCRIPTIONS_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "descriptions_cache.json")
+# Classifications used to be a JSON file, made under the profile in theme_profile.json.
+LEGACY_CLASSIFICATIONS_JSON = "classifications.json"
+PROFILE_JSON = "theme_profile.json"
+
+def _create_books(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS books
+                    (id INTEGER PRIMARY KEY,
+                     title TEXT,
+                     series TEXT,
+                     series_number TEXT,
+                     author TEXT,
+                     pages_reported_by_kindle INTEGER,
+                     goodreads_link TEXT,
+                     average_rating REAL,
+                     number_of_ratings INTEGER)''')
+
+def _create_ratings_and_refreshes(conn):
+    # Ratings stay unique by title (series ratings are matched by the series string), book_id is
+    # NULL only for legacy ratings whose title no longer matches a book.
+    conn.execute('''CREATE TABLE IF NOT EXISTS book_ratings
+                    (id INTEGER PRIMARY KEY,
+                     book_id INTEGER REFERENCES books(id),
+                     title TEXT NOT NULL UNIQUE,
+                     series TEXT,
+                     tier TEXT,
+                     interested BOOLEAN)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS book_refreshes
+                    (book_id INTEGER PRIMARY KEY REFERENCES books(id),
+                     last_refresh TEXT NOT NULL)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS series_refreshes
+                    (series TEXT PRIMARY KEY,
+                     last_refresh TEXT NOT NULL)''')
+
+def _create_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS books_title ON books(title)")
+    conn.execute("CREATE INDEX IF NOT EXISTS books_series ON books(series)")
+    conn.execute("CREATE INDEX IF NOT EXISTS books_author ON books(author)")
+    conn.execute("CREATE INDEX IF NOT EXISTS books_number_of_ratings ON books(number_of_ratings)")
+    conn.execute("CREATE INDEX IF NOT EXISTS book_ratings_book_id ON book_ratings(book_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS book_ratings_series ON book_ratings(series)")
+    conn.execute("CREATE INDEX IF NOT EXISTS book_refreshes_last_refresh ON book_refreshes(last_refresh)")
+    conn.execute("CREATE INDEX IF NOT EXISTS series_refreshes_last_refresh ON series_refreshes(last_refresh)")
+
+def _attached_tables(conn, alias):
+    return {row[0] for row in conn.execute(f"SELECT name FROM {alias}.sqlite_master WHERE type = 'table'")}
+
+def _import_legacy_databases(conn):
+    """ Copy ratings and refresh metadata from the old per-table files, resolving titles to book ids. """
+    if os.path.exists(LEGACY_RATINGS_DB):
+        conn.execute("ATTACH DATABASE ? AS legacy", (LEGACY_RATINGS_DB,))
+        if 'book_ratings' in _attached_tables(conn, 'legacy'):
+            conn.execute('''INSERT OR IGNORE INTO book_ratings(book_id, title, series, tier, interested)
+                            SELECT (SELECT MIN(id) FROM books WHERE books.title = r.title), r.title, r.series, r.tier, r.interested
+                            FROM legacy.book_ratings r''')
+        conn.commit()
+        conn.execute("DETACH DATABASE legacy")
+        logging.info(f"Imported ratings from {LEGACY_RATINGS_DB}, it's no longer used.")
+
+    if os.path.exists(LEGACY_REFRESH_METADATA_DB):
+        conn.execute("ATTACH DATABASE ? AS legacy", (LEGACY_REFRESH_METADATA_DB,))
+        tables = _attached_tables(conn, 'legacy')
+        if 'book_refresh_by_title' in tables:
+            # Titles that no longer match a book are dropped, they'd only cause an early refresh.
+            conn.execute('''INSERT OR REPLACE INTO book_refreshes(book_id, last_refresh)
+                            SELECT books.id, MAX(r.last_refresh)
+                            FROM legacy.book_refresh_by_title r JOIN books ON books.title = r.title
+                            GROUP BY books.id''')
+        if 'book_refresh_by_series' in tables:
+            conn.execute('''INSERT OR REPLACE INTO series_refreshes(series, last_refresh)
+                            SELECT series, last_refresh FROM legacy.book_refresh_by_series''')
+        conn.commit()
+        conn.execute("DETACH DATABASE legacy")
+        logging.info(f"Imported refresh metadata from {LEGACY_REFRESH_METADATA_DB}, it's no longer used.")
+
+def _series_stats_insert_sql(series, where):
+    """ INSERT computing series_stats rows for the books matching `where`, `series` is the series of the current group. """
+    return f'''
+        INSERT INTO series_stats(series, book_count, total_pages, total_ratings, start_rating, min_rating, member_ids)
+        SELECT series,
+               COUNT(*),
+               SUM(COALESCE(pages_reported_by_kindle, 0)),
+               SUM(COALESCE(number_of_ratings, 0)),
+               (SELECT COALESCE(average_rating, 0) FROM books WHERE series = {series} ORDER BY series_number, id LIMIT 1),
+               MIN(CASE WHEN number_of_ratings > 10 AND COALESCE(average_rating, 0) != 0 THEN average_rating END),
+               (SELECT json_group_array(id) FROM (SELECT id FROM books WHERE series = {series} ORDER BY series_number, id))
+        FROM books AS series_books
+        WHERE {where}
+        GROUP BY series'''
+
+def _series_stats_refresh_sql(series):
+    """ Trigger statements recomputing the series_stats row of `series` (NEW.series / OLD.series). """
+    return f'''
+        DELETE FROM series_stats WHERE series = {series};
+        {_series_stats_insert_sql(series, f"series = {series}")};'''
+
+def _create_series_stats(conn):
+    # Per-series aggregates, kept up to date by triggers on every write to books (REPLACE fires
+    # the delete trigger too, see recursive_triggers in db.PRAGMAS). Members are ordered by
+    # series_number, so the start rating is the first volume's, and
+    # min_rating only counts rated books (more than 10 ratings, like Book.has_rating_less_than).
+    conn.execute('''CREATE TABLE IF NOT EXISTS series_stats
+                    (series TEXT PRIMARY KEY,
+                     book_count INTEGER NOT NULL,
+                     total_pages INTEGER NOT NULL,
+                     total_ratings INTEGER NOT NULL,
+                     start_rating REAL NOT NULL,
+                     min_rating REAL,
+                     member_ids TEXT NOT NULL)''')
+    conn.executescript(f'''
+        CREATE TRIGGER IF NOT EXISTS books_series_stats_insert AFTER INSERT ON books
+        WHEN NULLIF(NEW.series, '') IS NOT NULL
+        BEGIN {_series_stats_refresh_sql('NEW.series')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS books_series_stats_delete AFTER DELETE ON books
+        WHEN NULLIF(OLD.series, '') IS NOT NULL
+        BEGIN {_series_stats_refresh_sql('OLD.series')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS books_series_stats_update_old_series AFTER UPDATE ON books
+        WHEN NULLIF(OLD.series, '') IS NOT NULL
+        BEGIN {_series_stats_refresh_sql('OLD.series')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS books_series_stats_update_new_series AFTER UPDATE ON books
+        WHEN NULLIF(NEW.series, '') IS NOT NULL AND NEW.series IS NOT OLD.series
+        BEGIN {_series_stats_refresh_sql('NEW.series')}
+        END;
+    ''')
+    conn.execute("DELETE FROM series_stats")
+    conn.execute(_series_stats_insert_sql("series_books.series", "NULLIF(series, '') IS NOT NULL"))
+
+def _create_descriptions(conn):
+    # Goodreads descriptions by book (see description_store.py), with an external-content FTS5
+    # index over the text that triggers keep in step with the table.
+    conn.execute('''CREATE TABLE IF NOT EXISTS descriptions
+                    (book_id INTEGER PRIMARY KEY,
+                     description TEXT NOT NULL,
+                     goodreads_link TEXT,
+                     published_raw TEXT,
+                     published_date TEXT,
+                     published_year INTEGER,
+                     fetched_at TEXT)''')
+    conn.executescript('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS descriptions_fts
+        USING fts5(description, content='descriptions', content_rowid='book_id');
+
+        CREATE TRIGGER IF NOT EXISTS descriptions_fts_insert AFTER INSERT ON descriptions BEGIN
+            INSERT INTO descriptions_fts(rowid, description) VALUES (NEW.book_id, NEW.description);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS descriptions_fts_delete AFTER DELETE ON descriptions BEGIN
+            INSERT INTO descriptions_fts(descriptions_fts, rowid, description) VALUES ('delete', OLD.book_id, OLD.description);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS descriptions_fts_update AFTER UPDATE OF description ON descriptions BEGIN
+            INSERT INTO descriptions_fts(descriptions_fts, rowid, description) VALUES ('delete', OLD.book_id, OLD.description);
+            INSERT INTO descriptions_fts(rowid, description) VALUES (NEW.book_id, NEW.description);
+        END;
+    ''')
+
+def _import_descriptions_cache(conn):
+    """ Copy descriptions from the old JSON cache (keyed by book id as a string). """
+    if not os.path.exists(LEGACY_DESCRIPTIONS_CACHE):
+        return
+    try:
+        with open(LEGACY_DESCRIPTIONS_CACHE) as f:
+            cache = json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        logging.warning(f"Couldn't read {LEGACY_DESCRIPTIONS_CACHE} ({e}), not importing it.")
+        return
+    rows = [(int(book_id), entry["description"], entry.get("goodreads_link"), entry.get("published_raw"),
+             entry.get("published_date"), entry.get("published_year"), entry.get("fetched_at"))
+            for book_id, entry in cache.items() if entry.get("description")]
+    conn.executemany('''INSERT OR IGNORE INTO descriptions
+                          (book_id, description, goodreads_link, published_raw, published_date, published_year, fetched_at)
+                          VALUES (?, ?, ?, ?, ?, ?, ?)''', rows)
+    logging.info(f"Imported {len(rows)} descriptions from {LEGACY_DESCRIPTIONS_CACHE}, it's no longer used.")
+
+def _create_classifications(conn):
+    # Claude's classification of a book under one version of the theme profile (see
+    # classification_store.py), with the hash of the description it was made from. Tags are
+    # rows of their own (in the order given) so they can be queried.
+    conn.execute('''CREATE TABLE IF NOT EXISTS classifications
+                    (book_id INTEGER NOT NULL,
+                     profile_version TEXT NOT NULL,
+                     description_hash TEXT NOT NULL,
+                     llm_fit INTEGER,
+                     predicted_tier TEXT,
+                     reasoning TEXT,
+                     classified_at TEXT NOT NULL,
+                     PRIMARY KEY (book_id, profile_version))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS classification_tags
+                    (book_id INTEGER NOT NULL,
+                     profile_version TEXT NOT NULL,
+                     tag TEXT NOT NULL,
+                     position INTEGER NOT NULL,
+                     PRIMARY KEY (book_id, profile_version, tag))''')
+    conn.execute("CREATE INDEX IF NOT EXISTS classification_tags_tag ON classification_tags(profile_version, tag)")
+
+def _import_classifications_json(conn):
+    """ Copy classifications from the old JSON file, as made from the currently stored descriptions under the current profile. """
+    if not os.path.exists(LEGACY_CLASSIFICATIONS_JSON) or not os.path.exists(PROFILE_JSON):
+        return
+    try:
+        with open(LEGACY_CLASSIFICATIONS_JSON) as f:
+            classifications = json.load(f)
+        with open(PROFILE_JSON) as f:
+            profile_version = json.load(f).get("generated_at", "")
+    except (json.JSONDecodeError, OSError) as e:
+        logging.warning(f"Couldn't read {LEGACY_CLASSIFICATIONS_JSON} ({e}), not importing it.")
+        return
+    description_hashes = {row[0]: content_hash(row[1]) for row in conn.execute("SELECT book_id, description FROM descriptions")}
+    imported_at = datetime.now(timezone.utc).isoformat()
+    imported = {int(book_id): c for book_id, c in classifications.items() if int(book_id) in description_hashes}
+    conn.executemany('''INSERT OR IGNORE INTO classifications
+                          (book_id, profile_version, description_hash, llm_fit, predicted_tier, reasoning, classified_at)
+                          VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                     [(book_id, profile_version, description_hashes[book_id], c.get("llm_fit"), c.get("predicted_tier"), c.get("reasoning"), imported_at)
+                      for book_id, c in imported.items()])
+    conn.executemany("INSERT OR IGNORE INTO classification_tags(book_id, profile_version, tag, position) VALUES (?, ?, ?, ?)",
+                     [(book_id, profile_version, tag, position)
+                      for book_id, c in imported.items() for position, tag in enumerate(c.get("tags", []))])
+    logging.info(f"Imported {len(imported)} classifications from {LEGACY_CLASSIFICATIONS_JSON}, it's no longer used.")
+
+def _key_classifications_by_inputs(conn):
+    # Record the model, and move classifications from the profile's generated_at to the hash of
+    # the prompt inputs it versions (see classification_store.profile_version), so they survive
+    # regenerating the profile with the same taxonomy.
+    from classification_store import profile_version
+    conn.execute("ALTER TABLE classifications ADD COLUMN model TEXT")
+    if not os.path.exists(PROFILE_JSON):
+        return
+    try:
+        with open(PROFILE_JSON) as f:
+            profile = json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        logging.warning(f"Couldn't read {PROFILE_JSON} ({e}), classifications made under it will be redone.")
+        return
+    versions = (profile_version(profile), profile.get("generated_at", ""))
+    conn.execute("UPDATE classifications SET profile_version = ? WHERE profile_version = ?", versions)
+    conn.execute("UPDATE classification_tags SET profile_version = ? WHERE profile_version = ?", versions)
+
+def _create_reddit_threads(conn):
+    # Fingerprint of each Reddit release thread's table as last ingested (see
+    # reddit_thread_store.py), so unchanged threads aren't fetched or matched again.
+    conn.execute('''CREATE TABLE IF NOT EXISTS reddit_threads
+                    (url TEXT PRIMARY KEY,
+                     rows_hash TEXT NOT NULL,
+                     row_count INTEGER NOT NULL,
+                     fetched_at TEXT NOT NULL,
+                     changed_at TEXT)''')
+
+def _create_reddit_row_books(conn):
+    # The book each Reddit release row (normalized title and author) was resolved to, see
+    # reddit_row_store.py.
+    conn.execute('''CREATE TABLE IF NOT EXISTS reddit_row_books
+                    (title TEXT NOT NULL,
+                     author TEXT NOT NULL,
+                     book_id INTEGER NOT NULL,
+                     resolved_at TEXT NOT NULL,
+                     PRIMARY KEY (title, author))''')
+
+# Append only: the DB's PRAGMA user_version is the number of migrations already applied.
+MIGRATIONS = [
+    _create_books,
+    _create_ratings_and_refreshes,
+    _create_indexes,
+    _import_legacy_databases,
+    _create_series_stats,
+    _create_descriptions,
+    _import_descriptions_cache,
+    _create_classifications,
+    _import_classifications_json,
+    _key_classifications_by_inputs,
+    _create_reddit_threads,
+    _create_reddit_row_books,
+]
+
+def migrate(conn):
+    """ Apply any migrations `conn`'s DB hasn't had yet, in order. """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        logging.info(f"Migrating DB to version {number} ({migration.__name__.strip('_')})..")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logging.error(e)
+            raise e
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Check the fast HTML parsing path against a full stdlib parse on saved Goodreads book pages.
+
+Book pages are scraped with the selected parser backend (lxml when installed) and a strainer
+that only builds the elements we read. This parses each saved page both ways and reports any
+field that comes out differently.
+
+  python3 parser_parity.py                       # every book page in the Goodreads response cache
+  python3 parser_parity.py saved/*.html          # specific saved pages
+  python3 parser_parity.py --parser html.parser  # check strained parsing with another backend
+
+Exits non-zero if any page differs.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+
+import goodreads
+
+
+def cached_book_pages():
+    """(url, path) for every book page body in the on-disk response cache."""
+    index = os.path.join(goodreads._HTTP_CACHE_DIR, "index.db")
+    if not os.path.exists(index):
+        return []
+    conn = sqlite3.connect(index)
+    rows = conn.execute("SELECT url, content_hash FROM responses WHERE url LIKE '%/book/show/%'").fetchall()
+    conn.close()
+    return [(url, os.path.join(goodreads._HTTP_CACHE_DIR, content_hash)) for url, content_hash in rows]
+
+
+def _fields(url, page_html, parser, parse_only):
+    try:
+        return goodreads.GoodreadsBookPage.from_html(url, page_html, parser=parser, parse_only=parse_only).fields()
+    except AttributeError as e:
+        return {"error": str(e)}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Compare fast/strained book page parsing against html.parser.")
+    parser.add_argument("pages", nargs="*", help="saved book page HTML files (default: the response cache)")
+    parser.add_argument("--parser", default=goodreads._html_parser, help="backend to check (default: the selected one)")
+    args = parser.parse_args()
+
+    pages = [(f"https://www.goodreads.com/book/show/{os.path.basename(p)}", p) for p in args.pages] or cached_book_pages()
+    if not pages:
+        logging.info("No saved book pages to compare.")
+        return
+
+    mismatches = 0
+    for url, path in pages:
+        with open(path, "rb") as f:
+            page_html = f.read().decode("utf-8", errors="replace")
+        expected = _fields(url, page_html, "html.parser", None)
+        actual = _fields(url, page_html, args.parser, goodreads.BOOK_PAGE_STRAINER)
+        diffs = {k for k in expected.keys() | actual.keys() if expected.get(k) != actual.get(k)}
+        if diffs:
+            mismatches += 1
+            logging.warning(f"{url}:")
+            for k in sorted(diffs):
+                logging.warning(f"  {k}: html.parser={expected.get(k)!r} {args.parser}={actual.get(k)!r}")
+
+    logging.info(f"Compared {len(pages)} pages with {args.parser}: {mismatches} differ.")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+import json
+from datetime import datetime, timezone
+import db
+from utils import stripped
+
+DB_NAME = db.DB_NAME
+
+UPSERT_ROW_SQL = '''INSERT INTO reddit_row_books(title, author, book_id, resolved_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(title, author) DO UPDATE SET
+                    book_id = excluded.book_id, resolved_at = excluded.resolved_at'''
+
+def row_key(book):
+    """ A Reddit row's (normalized title, normalized author), as written in the thread. """
+    return book.normalized_title, stripped(book.author)
+
+class RedditRowStore:
+    """
+    The Goodreads id each Reddit release row (by `row_key`) was resolved or matched to, in the
+    reddit_row_books table, so rows seen before are known without fuzzy matching or a search.
+    """
+    def __init__(self, db_name=DB_NAME):
+        self.db_name = db_name
+
+    def book_ids(self, keys):
+        """ Book id by row key, for the `keys` resolved before. """
+        cur = db.connection(self.db_name).execute(
+            '''SELECT r.title, r.author, r.book_id FROM reddit_row_books r
+               JOIN json_each(?) k ON r.title = json_extract(k.value, '$[0]') AND r.author = json_extract(k.value, '$[1]')''',
+            (json.dumps([list(key) for key in keys]),))
+        return {(title, author): book_id for title, author, book_id in cur}
+
+    def put(self, key, book_id, writer=None):
+        """ Record that the row `key` is the book `book_id`, queued on `writer` (a BatchWriter) if given. """
+        params = (*key, book_id, datetime.now(timezone.utc).isoformat())
+        if writer is not None:
+            writer.add(UPSERT_ROW_SQL, params)
+            return
+        conn = db.connection(self.db_name)
+        conn.execute(UPSERT_ROW_SQL, params)
+        conn.commit()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+import json
+from datetime import datetime, timedelta, timezone
+import db
+from books_from_reddit import reddit_post_id
+from utils import content_hash
+
+DB_NAME = db.DB_NAME
+
+# The newest threads are always fetched and matched, new releases are added to them all month
+# (and ones not on Goodreads yet are looked up again).
+RECENT_THREAD_COUNT = 2
+# Threads whose table changed this recently are fetched again.
+RECENTLY_CHANGED = timedelta(days=45)
+# Every thread is fetched again this long after its last fetch, in case an old one was edited.
+RECHECK_AFTER = timedelta(days=180)
+
+UPSERT_THREAD_SQL = '''INSERT INTO reddit_threads(url, rows_hash, row_count, fetched_at, changed_at)
+                       VALUES (?, ?, ?, ?, ?)
+                       ON CONFLICT(url) DO UPDATE SET
+                       rows_hash = excluded.rows_hash, row_count = excluded.row_count,
+                       fetched_at = excluded.fetched_at, changed_at = excluded.changed_at'''
+
+def rows_hash(books):
+    """ Fingerprint of a release thread's parsed table (titles and authors, in order). """
+    return content_hash(json.dumps([[book.title, book.author] for book in books]))
+
+class RedditThreadStore:
+    """
+    Fingerprints of Reddit release threads as last ingested, in the reddit_threads table: the
+    hash of the parsed table rows, when the thread was last fetched and when its rows last
+    changed (NULL if they never did since it was first ingested).
+    """
+    def __init__(self, db_name=DB_NAME):
+        self.db_name = db_name
+
+    def fingerprints(self, urls):
+        """ (rows_hash, fetched_at, changed_at) by url, for the urls that have been ingested. """
+        cur = db.connection(self.db_name).execute(
+            '''SELECT url, rows_hash, fetched_at, changed_at FROM reddit_threads
+               WHERE url IN (SELECT value FROM json_each(?))''', (json.dumps(list(urls)),))
+        return {row[0]: row[1:] for row in cur}
+
+    def newest(self, urls):
+        """ The RECENT_THREAD_COUNT newest of `urls` by Reddit post id. """
+        post_ids = {url: reddit_post_id(url) for url in urls}
+        return set(sorted((url for url in urls if post_ids[url] is not None), key=post_ids.get)[-RECENT_THREAD_COUNT:])
+
+    def due(self, urls, now=None):
+        """
+        The `urls` worth fetching, in order: threads never ingested, the RECENT_THREAD_COUNT
+        newest, ones changed within RECENTLY_CHANGED and ones not fetched within RECHECK_AFTER.
+        """
+        now = now or datetime.now(timezone.utc)
+        fingerprints = self.fingerprints(urls)
+        newest = self.newest(urls)
+        due = []
+        for url in urls:
+            if url not in fingerprints or reddit_post_id(url) is None or url in newest:
+                due.append(url)
+                continue
+            _, fetched_at, changed_at = fingerprints[url]
+            if changed_at and datetime.fromisoformat(changed_at) > now - RECENTLY_CHANGED:
+                due.append(url)
+            elif datetime.fromisoformat(fetched_at) <= now - RECHECK_AFTER:
+                due.append(url)
+        return due
+
+    def put(self, url, new_hash, row_count, previous, fetched_at, writer=None):
+        """
+        Record the rows hash (see `rows_hash`) and row count of `url` as fetched at `fetched_at`,
+        given its `previous` fingerprint (or None). Queued on `writer` (a BatchWriter) if given.
+        """
+        if previous is None:
+            changed_at = None
+        elif previous[0] != new_hash:
+            changed_at = fetched_at.isoformat()
+        else:
+            changed_at = previous[2]
+        params = (url, new_hash, row_count, fetched_at.isoformat(), changed_at)
+        if writer is not None:
+            writer.add(UPSERT_THREAD_SQL, params)
+            return
+        conn = db.connection(self.db_name)
+        conn.execute(UPSERT_THREAD_SQL, params)
+        conn.commit()
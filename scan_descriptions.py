@@ -1,17 +1,17 @@
 #!/usr/bin/env python3
-"""Fetch + cache Goodreads descriptions for a set of books.
+"""Fetch + store Goodreads descriptions for a set of books (in books.db).
 
 Usage:
   python3 scan_descriptions.py --scope profile     # rated set + sampled dislikes (~218)
   python3 scan_descriptions.py --scope candidates  # all books with >=50 ratings (~2,701)
 
-Resumable: descriptions already in descriptions_cache.json are skipped.
+Resumable: books that already have a stored description are skipped.
 """
 import argparse
 import logging
 
 import theme_scan_lib as lib
-from book import Book
+from book_repository import BookRepository
 from book_rating import BookRating
 
 
@@ -23,20 +23,18 @@ def main():
     parser.add_argument("--min-pages", type=int, default=500, help="min pages (book or series) for candidate scope")
     args = parser.parse_args()
 
-    books = Book.load_books_from_db()
-
     if args.scope == "profile":
         ratings = BookRating.load_ratings_from_db()
-        split = lib.profile_split(books, ratings)
+        repo = BookRepository()
+        split = lib.profile_split(repo, ratings)
         wanted_ids = set(lib.profile_book_ids(split))
-        targets = [b for b in books if b.id in wanted_ids]
+        targets = sorted(repo.by_ids(wanted_ids).values(), key=lambda b: b.id)
         logging.info(
             f"Profile scope: {len(split['liked'])} liked, {len(split['disliked_f'])} F-tier, "
             f"{len(split['disliked_sample'])} sampled dislikes -> {len(targets)} books."
         )
     else:
-        ratings = BookRating.load_ratings_from_db()
-        targets = lib.recommendable_books(books, ratings, min_pages=args.min_pages)
+        targets = lib.recommendable_books(min_pages=args.min_pages)
         logging.info(
             f"Candidate scope (rate-continuous filters: >4 rating, >= {args.min_pages} pages, "
             f">= {lib.MIN_RATINGS_FOR_CANDIDATE} ratings, unrated): {len(targets)} books."
@@ -2,35 +2,51 @@
 """Interactive recommendations server.
 
 Serves the preference-fit ranking with S/A/B/F + "Not interested" buttons on each row.
-Clicking a button records the rating in book_ratings.db (via the existing BookRating
+Clicking a button records the rating in books.db (via the existing BookRating
 model) and removes the book — and its whole series — from the list in real time.
 
   python3 serve_recommendations.py            # http://localhost:8765
   python3 serve_recommendations.py --port 9000 --rating-weight 4
 
 No new dependencies (stdlib http.server). Re-reads ratings on every page load, so the
-list always reflects what you've rated.
+list always reflects what you've rated. The search box also matches book descriptions
+(full-text, via /search).
 """
 import argparse
 import json
 import logging
-import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
 
 import classify_and_rank as cr
+import db
 import theme_scan_lib as lib
-from book import Book
+from book_repository import BookRepository
 from book_rating import BookRating, Tier
+from classification_store import ClassificationStore, profile_version
+from description_store import DescriptionStore
 
-RATINGS_DB = "book_ratings.db"
+HANDLER_THREADS = 8
 
 PROFILE_JSON = "theme_profile.json"
-CLASSIFICATIONS_JSON = "classifications.json"
 
 RATE_JS = """
 <div id="toast"></div>
 <script>
+// Let the search box match descriptions too, searched server-side as you type.
+let searchTimer;
+F.text.addEventListener('input', () => {
+  clearTimeout(searchTimer);
+  const q = F.text.value.trim();
+  searchTimer = setTimeout(async () => {
+    const ids = q ? (await (await fetch('/search?q=' + encodeURIComponent(q))).json()).ids : null;
+    if (F.text.value.trim() !== q) return;  // a newer search is on its way
+    descriptionMatches = ids && new Set(ids);
+    applyFilters();
+  }, 200);
+});
 let toastTimer;
 function toast(msg, undoId) {
   const el = document.getElementById('toast');
@@ -95,6 +111,11 @@ class Handler(BaseHTTPRequestHandler):
         self.wfile.write(data)
 
     def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/search":
+            text = parse_qs(url.query).get("q", [""])[0]
+            self._send(200, json.dumps({"ids": self.server.search(text)}), "application/json")
+            return
         if self.path not in ("/", "/index.html"):
             self._send(404, "not found")
             return
@@ -118,17 +139,25 @@ class Handler(BaseHTTPRequestHandler):
 
 
 class RecServer(ThreadingHTTPServer):
-    def __init__(self, addr, profile, classifications, rating_weight):
+    def __init__(self, addr, profile, rating_weight):
         super().__init__(addr, Handler)
         self.profile = profile
-        self.classifications = classifications
+        self.classifications = ClassificationStore(profile_version(profile))
         self.rating_weight = rating_weight
+        # Requests are handled on long-lived threads (rather than a new thread per request), so
+        # each keeps its DB connections open across requests, see db.connection.
+        self._handler_pool = ThreadPoolExecutor(max_workers=HANDLER_THREADS, thread_name_prefix="rec-handler")
+
+    def process_request(self, request, client_address):
+        self._handler_pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self._handler_pool.shutdown(wait=False)
 
     def render_page(self):
-        books = Book.load_books_from_db()
-        self.books_by_id = {b.id: b for b in books}
         ratings = BookRating.load_ratings_from_db()
-        rows = cr.compute_rows(self.profile, self.classifications, self.books_by_id,
+        rows = cr.compute_rows(self.profile, self.classifications.load(), BookRepository(),
                                ratings=ratings, series_aware=True, rating_weight=self.rating_weight)
         out = [cr.HTML_HEAD.format(
             generated=datetime.now(timezone.utc).isoformat(),
@@ -139,9 +168,12 @@ class RecServer(ThreadingHTTPServer):
         out.append(cr.HTML_TAIL.replace("</body></html>", RATE_JS + "</body></html>"))
         return "\n".join(out)
 
+    def search(self, text):
+        """Ids of books whose description matches `text`."""
+        return DescriptionStore().search(text)
+
     def _book(self, book_id):
-        return getattr(self, "books_by_id", {}).get(book_id) or \
-            {b.id: b for b in Book.load_books_from_db()}.get(book_id)
+        return BookRepository().by_id(book_id)
 
     def record_rating(self, book_id, action):
         book = self._book(book_id)
@@ -167,10 +199,9 @@ class RecServer(ThreadingHTTPServer):
         book = self._book(book_id)
         if not book:
             return {"ok": False, "error": f"unknown book id {book_id}"}
-        conn = sqlite3.connect(RATINGS_DB)
+        conn = db.connection()
         conn.execute("DELETE FROM book_ratings WHERE title = ?", (book.title,))
         conn.commit()
-        conn.close()
         logging.info(f"Un-rated '{book.title}'")
         return {"ok": True, "title": book.series or book.title}
 
@@ -184,10 +215,7 @@ def main():
 
     with open(PROFILE_JSON) as f:
         profile = json.load(f)
-    with open(CLASSIFICATIONS_JSON) as f:
-        classifications = json.load(f)
-
-    server = RecServer(("127.0.0.1", args.port), profile, classifications, args.rating_weight)
+    server = RecServer(("127.0.0.1", args.port), profile, args.rating_weight)
     url = f"http://localhost:{args.port}"
     logging.info(f"Serving recommendations at {url}  (Ctrl-C to stop)")
     try:
@@ -6,7 +6,10 @@ setup(
     packages=find_packages(),
     install_requires=[
         'requests',
+        'aiohttp',  # Async HTTP client behind goodreads.AsyncFetcher's shared connection pool
+        'yarl',  # URLs for aiohttp's cookie jar (imported directly by goodreads)
         'beautifulsoup4',
+        'lxml',  # Fast HTML parser backend for scraping (falls back to html.parser if missing)
         'prettytable',
         'fuzzywuzzy',
         'python-Levenshtein',  # Add python-Levenshtein to remove fuzzywuzzy warning
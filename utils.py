@@ -1,3 +1,4 @@
+import hashlib
 import re
 
 def stripped_title(title):
@@ -9,4 +10,12 @@ def stripped_title(title):
 
 def stripped(text):
     text = re.sub(r'[^\w\s]', '', text).lower().strip()
-    return text 
\ No newline at end of file
+    return text 
+
+def trigrams(text):
+    """ Set of overlapping 3-character substrings of `text` (empty when shorter than 3). """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def content_hash(text):
+    """ Short stable hash of `text`, used to notice when stored inputs (e.g. a description) change. """
+    return hashlib.sha256((text or "").encode()).hexdigest()[:16]